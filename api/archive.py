@@ -0,0 +1,118 @@
+import gzip
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Iterator, Optional
+
+from logger_config import setup_logger
+from config import settings
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = setup_logger(__name__)
+
+class PageArchive:
+    def __init__(self, path: str = None, retention_days: int = None):
+        self.root = Path(path or settings.PAGE_ARCHIVE_PATH)
+        self.retention_days = retention_days or settings.PAGE_ARCHIVE_RETENTION_DAYS
+        self.codec = 'zstd' if zstandard is not None else 'gzip'
+        self.lock = threading.Lock()
+
+    def object_path(self, digest: str, codec: str) -> Path:
+        suffix = 'zst' if codec == 'zstd' else 'gz'
+        return self.root / 'objects' / digest[:2] / f"{digest}.html.{suffix}"
+
+    def manifest_path(self, day: datetime) -> Path:
+        return self.root / 'manifest' / f"{day:%Y-%m-%d}.jsonl"
+
+    def compress(self, body: bytes) -> bytes:
+        if self.codec == 'zstd':
+            return zstandard.ZstdCompressor(level=settings.PAGE_ARCHIVE_LEVEL).compress(body)
+        return gzip.compress(body, compresslevel=min(settings.PAGE_ARCHIVE_LEVEL, 9))
+
+    def decompress(self, data: bytes, codec: str) -> bytes:
+        if codec == 'zstd':
+            if zstandard is None:
+                raise RuntimeError("Для чтения архива требуется пакет zstandard")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    def store(self, link: str, body: bytes, fetched_at: Optional[datetime] = None) -> str:
+        fetched_at = fetched_at or datetime.utcnow()
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.object_path(digest, self.codec)
+
+        data = None if path.exists() else self.compress(body)
+
+        record = {
+            'link': link,
+            'digest': digest,
+            'codec': self.codec,
+            'fetched_at': fetched_at.isoformat()
+        }
+        manifest = self.manifest_path(fetched_at)
+        with self.lock:
+            if not path.exists():
+                data = data or self.compress(body)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp_path = path.with_suffix(path.suffix + '.tmp')
+                tmp_path.write_bytes(data)
+                tmp_path.replace(path)
+
+            manifest.parent.mkdir(parents=True, exist_ok=True)
+            with open(manifest, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+        return digest
+
+    def load(self, record: dict) -> bytes:
+        return self.decompress(self.object_path(record['digest'], record['codec']).read_bytes(), record['codec'])
+
+    def iter_records(self, since: Optional[datetime] = None, until: Optional[datetime] = None) -> Iterator[dict]:
+        for manifest in sorted((self.root / 'manifest').glob('*.jsonl')):
+            day = datetime.strptime(manifest.stem, '%Y-%m-%d')
+            if since and day + timedelta(days=1) <= since:
+                continue
+            if until and day > until:
+                continue
+
+            with open(manifest, encoding='utf-8') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    record = json.loads(line)
+                    fetched_at = datetime.fromisoformat(record['fetched_at'])
+                    if since and fetched_at < since:
+                        continue
+                    if until and fetched_at > until:
+                        continue
+                    record['fetched_at'] = fetched_at
+                    yield record
+
+    def apply_retention(self) -> dict:
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        removed_manifests = 0
+        removed_objects = 0
+
+        with self.lock:
+            for manifest in (self.root / 'manifest').glob('*.jsonl'):
+                if datetime.strptime(manifest.stem, '%Y-%m-%d') + timedelta(days=1) <= cutoff:
+                    manifest.unlink()
+                    removed_manifests += 1
+
+            referenced = {record['digest'] for record in self.iter_records()}
+            for path in (self.root / 'objects').glob('*/*.html.*'):
+                if path.name.split('.')[0] not in referenced:
+                    path.unlink()
+                    removed_objects += 1
+
+        logger.info(
+            f"Очистка архива страниц: удалено {removed_manifests} журналов и {removed_objects} страниц "
+            f"старше {self.retention_days} дней"
+        )
+        return {'manifests': removed_manifests, 'objects': removed_objects}
@@ -2,10 +2,14 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sess
 from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy import text
 from contextlib import asynccontextmanager
+import asyncio
+import time
 
 from models import Base, Product, PriceHistory
+from migrations import run_migrations
 from logger_config import setup_logger
 from config import settings
+from metrics import registry, DB_POOL
 
 logger = setup_logger(__name__)
 
@@ -20,77 +24,65 @@ class DatabaseManager:
         self.departments = None
         self.roles = None
         self.users = None
+        
+        registry.add_collector(self.collect_metrics)
 
-    async def check_database_exists(self) -> bool:
-        try:
-            test_url = settings.DATABASE_URL
-            test_engine = create_async_engine(test_url, echo=False)
-            async with test_engine.connect() as conn:
-                await conn.execute(text("SELECT 1"))
-            await test_engine.dispose()
-            return True
-        except Exception as e:
-            logger.error(f"Ошибка подключения к базе данных: {e}")
-            return False
-
-    async def check_tables_exist(self) -> bool:
+    def collect_metrics(self):
         if not self.engine:
-            return False
-            
-        try:
-            async with self.engine.connect() as conn:
-                tables_to_check = ['products', 'price_history']
-                
-                for table_name in tables_to_check:
-                    result = await conn.execute(
-                        text("""
-                            SELECT EXISTS (
-                                SELECT FROM information_schema.tables 
-                                WHERE table_schema = 'public' 
-                                AND table_name = :table_name
-                            )
-                        """), {'table_name': table_name}
-                    )
-                    exists = result.scalar()
-                    if not exists:
-                        logger.warning(f"Таблица {table_name} не найдена")
-                        return False
-                
-                logger.info("Все необходимые таблицы существуют")
+            return
+        pool = self.engine.sync_engine.pool
+        for state in ('size', 'checkedin', 'checkedout', 'overflow'):
+            method = getattr(pool, state, None)
+            if method:
+                DB_POOL.set(method(), state=state)
+
+    def create_engine(self):
+        if self.engine:
+            return
+        self.engine = create_async_engine(settings.DATABASE_URL, echo=False)
+        self.async_session = async_sessionmaker(
+            self.engine, 
+            class_=AsyncSession, 
+            expire_on_commit=False
+        )
+
+    async def wait_for_database(self) -> bool:
+        deadline = time.monotonic() + settings.DB_CONNECT_TIMEOUT
+        delay = 0.1
+        attempt = 0
+        
+        while True:
+            attempt += 1
+            try:
+                async with self.engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+                if attempt > 1:
+                    logger.info(f"База данных доступна после {attempt} попыток подключения")
                 return True
-        except Exception as e:
-            logger.error(f"Ошибка проверки таблиц: {e}")
-            return False
+            except Exception as e:
+                if time.monotonic() + delay > deadline:
+                    logger.error(f"Ошибка подключения к базе данных после {attempt} попыток: {e}")
+                    return False
+                logger.warning(f"База данных еще не принимает подключения (попытка {attempt}), повтор через {delay:.1f} с: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, settings.DB_CONNECT_RETRY_MAX)
 
     async def initialize_database(self):
         if self._initialized:
             return True
-            
+        
+        started = time.perf_counter()
         try:
-            if not await self.check_database_exists():
+            self.create_engine()
+            
+            if not await self.wait_for_database():
                 logger.error("Не удалось подключиться к базе данных")
                 return False
             
-            database_url = settings.DATABASE_URL
-            
-            self.engine = create_async_engine(database_url, echo=False)
-            self.async_session = async_sessionmaker(
-                self.engine, 
-                class_=AsyncSession, 
-                expire_on_commit=False
-            )
-            
-            tables_exist = await self.check_tables_exist()
-            
-            if not tables_exist:
-                logger.info("Создание таблиц...")
-                async with self.engine.begin() as conn:
-                    await conn.run_sync(Base.metadata.create_all)
-                logger.info("Таблицы успешно созданы")
-            else:
-                logger.info("Таблицы уже существуют")
+            await run_migrations(self.engine)
             
             self._initialized = True
+            logger.info(f"База данных готова за {time.perf_counter() - started:.2f} с")
             return True
             
         except SQLAlchemyError as e:
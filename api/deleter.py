@@ -0,0 +1,49 @@
+import asyncio
+
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+class ProductDeleter:
+    def __init__(self, price_manager):
+        self.price_manager = price_manager
+        self.tasks = set()
+
+    def spawn(self, job_id: int, product_ids, start: int = 0):
+        task = asyncio.create_task(self.run(job_id, product_ids, start))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def start(self, product_ids):
+        result = await self.price_manager.create_delete_job(product_ids)
+        if not result.error:
+            self.spawn(result.payload.id, list(dict.fromkeys(product_ids)))
+        return result
+
+    async def resume(self):
+        try:
+            jobs = await self.price_manager.get_unfinished_delete_jobs()
+        except Exception as e:
+            logger.error(f"Ошибка загрузки незавершенных заданий удаления: {str(e)}")
+            return
+
+        for job in jobs:
+            logger.info(f"Возобновление задания удаления ID {job.id} с позиции {job.processed}")
+            self.spawn(job.id, job.product_ids, job.processed)
+
+    async def run(self, job_id: int, product_ids, start: int):
+        error = None
+        try:
+            result = await self.price_manager.delete_products(product_ids, job_id=job_id, start=start)
+            if result.error:
+                error = result.message
+        except Exception as e:
+            logger.error(f"Ошибка удаления товаров, задание {job_id}: {str(e)}")
+            error = str(e)
+
+        await self.price_manager.finish_delete_job(job_id, error)
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
@@ -0,0 +1,58 @@
+import asyncio
+
+from logger_config import setup_logger
+from config import settings
+
+logger = setup_logger(__name__)
+
+class EnrichmentWorker:
+    def __init__(self, price_manager, concurrency: int = None):
+        self.price_manager = price_manager
+        self.semaphore = asyncio.Semaphore(concurrency or settings.ENRICHMENT_CONCURRENCY)
+        self.wakeup = asyncio.Event()
+        self.task = None
+
+    def notify(self):
+        self.wakeup.set()
+
+    async def enrich(self, product):
+        async with self.semaphore:
+            product_info = await self.price_manager.fetch_product_info(product.link)
+            await self.price_manager.finish_enrichment(product.id, product_info)
+
+    async def run_once(self) -> int:
+        result = await self.price_manager.claim_enrichment_batch(settings.ENRICHMENT_BATCH_SIZE)
+        if result.error or not result.payload:
+            return 0
+
+        products = result.payload
+        logger.info(f"Обогащение {len(products)} новых товаров")
+        results = await asyncio.gather(*(self.enrich(product) for product in products), return_exceptions=True)
+        for product, outcome in zip(products, results):
+            if isinstance(outcome, Exception):
+                logger.error(f"Ошибка обогащения товара {product.id}: {str(outcome)}")
+        return len(products)
+
+    async def run(self):
+        while True:
+            try:
+                if await self.run_once():
+                    continue
+            except Exception as e:
+                logger.error(f"Ошибка в цикле обогащения товаров: {str(e)}")
+
+            try:
+                await asyncio.wait_for(self.wakeup.wait(), settings.ENRICHMENT_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self.wakeup.clear()
+
+    def start(self):
+        if not self.task:
+            self.task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self.task:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+            self.task = None
@@ -0,0 +1,133 @@
+import asyncio
+import csv
+import json
+import os
+import tempfile
+from pathlib import Path
+
+from logger_config import setup_logger
+from config import settings
+
+logger = setup_logger(__name__)
+
+LINK_COLUMNS = ('link', 'url', 'href')
+
+def parse_json_line(line: str):
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None, None
+    if isinstance(record, str):
+        return record, None
+    if isinstance(record, dict):
+        link = next((record.get(column) for column in LINK_COLUMNS if record.get(column)), None)
+        return link, record.get('name')
+    return None, None
+
+def iter_lines(f, position: list):
+    while True:
+        line = f.readline()
+        if not line:
+            return
+        position[0] = f.tell()
+        yield line
+
+def iter_rows(path: str, is_csv: bool):
+    position = [0]
+    with open(path, encoding='utf-8-sig', errors='replace', newline='') as f:
+        lines = iter_lines(f, position)
+        if is_csv:
+            link_index, name_index = 0, None
+            for number, row in enumerate(csv.reader(lines)):
+                columns = [column.strip().lower() for column in row]
+                if number == 0 and any(column in LINK_COLUMNS for column in columns):
+                    link_index = next(i for i, column in enumerate(columns) if column in LINK_COLUMNS)
+                    name_index = columns.index('name') if 'name' in columns else None
+                    continue
+                if not row:
+                    continue
+                link = row[link_index] if len(row) > link_index else None
+                name = row[name_index] if name_index is not None and len(row) > name_index else None
+                yield link, name, position[0]
+        else:
+            for line in lines:
+                line = line.strip()
+                if not line:
+                    continue
+                if line.startswith(('{', '"')):
+                    link, name = parse_json_line(line)
+                    yield link, name, position[0]
+                else:
+                    yield line, None, position[0]
+
+def read_batch(rows, size: int):
+    batch = []
+    position = 0
+    for link, name, position in rows:
+        batch.append((link or '', name))
+        if len(batch) >= size:
+            break
+    return batch, position
+
+class ProductImporter:
+    def __init__(self, price_manager, on_batch=None):
+        self.price_manager = price_manager
+        self.on_batch = on_batch
+        self.spool = Path(settings.IMPORT_SPOOL_PATH)
+        self.tasks = set()
+
+    async def spool_upload(self, stream) -> tuple:
+        self.spool.mkdir(parents=True, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix='import-', dir=self.spool)
+        size = 0
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                async for chunk in stream:
+                    f.write(chunk)
+                    size += len(chunk)
+        except Exception:
+            os.unlink(path)
+            raise
+        return path, size
+
+    async def start(self, stream, is_csv: bool):
+        path, size = await self.spool_upload(stream)
+        result = await self.price_manager.create_import_job(size)
+        if result.error:
+            os.unlink(path)
+            return result
+
+        task = asyncio.create_task(self.run(result.payload.id, path, is_csv))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return result
+
+    async def run(self, job_id: int, path: str, is_csv: bool):
+        loop = asyncio.get_running_loop()
+        error = None
+        rows = iter_rows(path, is_csv)
+        try:
+            while True:
+                batch, position = await loop.run_in_executor(None, read_batch, rows, settings.IMPORT_BATCH_SIZE)
+                if not batch:
+                    break
+
+                result = await self.price_manager.import_products_batch(job_id, batch, position)
+                if result.error:
+                    error = result.message
+                    break
+                if result.payload['inserted'] and self.on_batch:
+                    self.on_batch()
+        except Exception as e:
+            logger.error(f"Ошибка импорта товаров, задание {job_id}: {str(e)}")
+            error = str(e)
+        finally:
+            rows.close()
+            os.unlink(path)
+
+        await self.price_manager.finish_import_job(job_id, error)
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
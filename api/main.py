@@ -1,31 +1,58 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Request, Query
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.templating import Jinja2Templates
-from typing import List
+from typing import List, Optional
+from datetime import datetime
+import time
 from contextlib import asynccontextmanager
 
-from schemas import ProductCreate, ProductResponse, PriceHistoryResponse
+from schemas import ProductCreate, ProductDeleteRequest, ProductResponse, ProductWithPricesResponse, PriceHistoryResponse, CrawlJobResponse, ImportJobResponse, DeleteJobResponse, LatestPriceResponse, PageResponse, PriceRollupResponse
 from pricemanager import PriceManager
-from config import DefaultResponse
+from config import DefaultResponse, settings
 from logger_config import setup_logger
 from database import db_manager
 from parser import XComParser as PriceParser
+from enrichment import EnrichmentWorker
+from importer import ProductImporter
+from deleter import ProductDeleter
+from metrics import registry
 
 logger = setup_logger(__name__)
 
 price_parser = None
 price_manager = None
+enrichment_worker = None
+product_importer = None
+product_deleter = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    started = time.perf_counter()
     await db_manager.initialize_database()
     
-    global price_parser, price_manager
+    global price_parser, price_manager, enrichment_worker, product_importer, product_deleter
     price_parser = PriceParser()
     price_manager = PriceManager(parser=price_parser)
     
+    if settings.ENRICHMENT_MODE == "background":
+        enrichment_worker = EnrichmentWorker(price_manager)
+        enrichment_worker.start()
+    
+    product_deleter = ProductDeleter(price_manager)
+    await product_deleter.resume()
+    
+    product_importer = ProductImporter(
+        price_manager,
+        on_batch=enrichment_worker.notify if enrichment_worker else None
+    )
+    logger.info(f"Холодный старт API: {time.perf_counter() - started:.2f} с")
+    
     yield
     
+    await product_importer.stop()
+    await product_deleter.stop()
+    if enrichment_worker:
+        await enrichment_worker.stop()
     if price_parser:
         await price_parser.close()
     await db_manager.close()
@@ -40,30 +67,28 @@ templates = Jinja2Templates(directory="templates")
 
 @app.get("/", response_class=HTMLResponse)
 async def read_root(request: Request):
-    products_result = await price_manager.get_all_products()
+    products_result = await price_manager.get_products_with_prices()
     products = products_result.payload if not products_result.error else []
     return templates.TemplateResponse("index.html", {"request": request, "products": products})
 
 @app.get("/products/{product_id}/prices-page", response_class=HTMLResponse)
-async def price_history_page(request: Request, product_id: int):
+async def price_history_page(request: Request, product_id: int, cursor: Optional[str] = None):
     try:
-        products_result = await price_manager.get_all_products()
-        if products_result.error:
-            return DefaultResponse(error=True, message="Товар не найден", payload=None)
-        
-        product = next((p for p in products_result.payload if p.id == product_id), None)
-        if not product:
+        product_result = await price_manager.get_product(product_id)
+        if product_result.error:
             return DefaultResponse(error=True, message="Товар не найден", payload=None)
         
-        price_history_result = await price_manager.get_price_history(product_id)
-        price_history = price_history_result.payload if not price_history_result.error else []
+        page_result = await price_manager.get_price_history_page(product_id, cursor=cursor)
+        if page_result.error:
+            return DefaultResponse(error=True, message=page_result.message, payload=None)
         
         return templates.TemplateResponse(
             "price_history.html", 
             {
                 "request": request, 
-                "product": product,
-                "price_history": price_history
+                "product": product_result.payload,
+                "price_history": page_result.payload.items,
+                "next_cursor": page_result.payload.next_cursor
             }
         )
         
@@ -85,6 +110,9 @@ async def add_product(product_data: ProductCreate) -> DefaultResponse[ProductRes
             logger.warning(f"Ошибка добавления товара: {result.message}")
             return DefaultResponse(error=True, message=result.message, payload=None)
         
+        if enrichment_worker:
+            enrichment_worker.notify()
+        
         logger.info(f"Товар успешно добавлен: ID {result.payload.id}")
         return result
         
@@ -96,6 +124,49 @@ async def add_product(product_data: ProductCreate) -> DefaultResponse[ProductRes
             payload=None
         )
 
+@app.post("/products/import", response_model=DefaultResponse[ImportJobResponse])
+async def import_products(request: Request) -> DefaultResponse[ImportJobResponse]:
+    try:
+        content_type = request.headers.get('content-type', '')
+        is_csv = 'csv' in content_type
+        logger.info(f"Импорт товаров: {content_type or 'text/plain'}")
+        
+        result = await product_importer.start(request.stream(), is_csv)
+        
+        if result.error:
+            logger.warning(f"Ошибка запуска импорта: {result.message}")
+            return DefaultResponse(error=True, message=result.message, payload=None)
+        
+        logger.info(f"Импорт запущен: задание ID {result.payload.id}")
+        return result
+        
+    except Exception as e:
+        logger.error(f"Ошибка API при импорте товаров: {str(e)}")
+        return DefaultResponse(
+            error=True,
+            message=f"Внутренняя ошибка сервера: {str(e)}",
+            payload=None
+        )
+
+@app.get("/imports/{job_id}", response_model=DefaultResponse[ImportJobResponse])
+async def get_import_job(job_id: int) -> DefaultResponse[ImportJobResponse]:
+    try:
+        result = await price_manager.get_import_job(job_id)
+        
+        if result.error:
+            logger.warning(f"Ошибка получения задания импорта: {result.message}")
+            return DefaultResponse(error=True, message=result.message, payload=None)
+        
+        return result
+        
+    except Exception as e:
+        logger.error(f"Ошибка API при получении задания импорта: {str(e)}")
+        return DefaultResponse(
+            error=True,
+            message=f"Внутренняя ошибка сервера: {str(e)}",
+            payload=None
+        )
+
 @app.delete("/products/{product_id}", response_model=DefaultResponse)
 async def delete_product(product_id: int) -> DefaultResponse:
     try:
@@ -118,12 +189,63 @@ async def delete_product(product_id: int) -> DefaultResponse:
             payload=None
         )
 
-@app.get("/products", response_model=DefaultResponse[List[ProductResponse]])
-async def get_products() -> DefaultResponse[List[ProductResponse]]:
+@app.post("/products/delete", response_model=DefaultResponse)
+async def delete_products(request: ProductDeleteRequest) -> DefaultResponse:
+    try:
+        product_ids = list(dict.fromkeys(request.product_ids))
+        logger.info(f"Массовое удаление товаров: {len(product_ids)} шт.")
+        
+        if await price_manager.has_large_history(product_ids, settings.DELETE_ASYNC_THRESHOLD):
+            result = await product_deleter.start(product_ids)
+            
+            if result.error:
+                logger.warning(f"Ошибка запуска удаления товаров: {result.message}")
+                return DefaultResponse(error=True, message=result.message, payload=None)
+            
+            logger.info(f"Удаление {len(product_ids)} товаров выполняется в фоне: задание ID {result.payload.id}")
+            return result
+        
+        result = await price_manager.delete_products(product_ids)
+        
+        if result.error:
+            logger.warning(f"Ошибка массового удаления товаров: {result.message}")
+            return DefaultResponse(error=True, message=result.message, payload=None)
+        
+        return result
+        
+    except Exception as e:
+        logger.error(f"Ошибка API при массовом удалении товаров: {str(e)}")
+        return DefaultResponse(
+            error=True,
+            message=f"Внутренняя ошибка сервера: {str(e)}",
+            payload=None
+        )
+
+@app.get("/delete-jobs/{job_id}", response_model=DefaultResponse[DeleteJobResponse])
+async def get_delete_job(job_id: int) -> DefaultResponse[DeleteJobResponse]:
+    try:
+        result = await price_manager.get_delete_job(job_id)
+        
+        if result.error:
+            logger.warning(f"Ошибка получения задания удаления: {result.message}")
+            return DefaultResponse(error=True, message=result.message, payload=None)
+        
+        return result
+        
+    except Exception as e:
+        logger.error(f"Ошибка API при получении задания удаления: {str(e)}")
+        return DefaultResponse(
+            error=True,
+            message=f"Внутренняя ошибка сервера: {str(e)}",
+            payload=None
+        )
+
+@app.get("/products", response_model=DefaultResponse[PageResponse[ProductResponse]])
+async def get_products(limit: Optional[int] = None, cursor: Optional[str] = None) -> DefaultResponse[PageResponse[ProductResponse]]:
     try:
         logger.info("Запрос списка товаров")
         
-        result = await price_manager.get_all_products()
+        result = await price_manager.get_products_page(limit=limit, cursor=cursor)
         
         if result.error:
             logger.warning(f"Ошибка получения списка товаров: {result.message}")
@@ -133,7 +255,7 @@ async def get_products() -> DefaultResponse[List[ProductResponse]]:
                 payload=None
             )
         
-        logger.info(f"Успешно возвращено {len(result.payload)} товаров")
+        logger.info(f"Успешно возвращено {len(result.payload.items)} товаров")
         return result
         
     except Exception as e:
@@ -144,12 +266,48 @@ async def get_products() -> DefaultResponse[List[ProductResponse]]:
             payload=None
         )
 
-@app.get("/products/{product_id}/prices", response_model=DefaultResponse[List[PriceHistoryResponse]])
-async def get_price_history(product_id: int) -> DefaultResponse[List[PriceHistoryResponse]]:
+@app.get("/products/with-prices", response_model=DefaultResponse[List[ProductWithPricesResponse]])
+async def get_products_with_prices() -> DefaultResponse[List[ProductWithPricesResponse]]:
+    try:
+        logger.info("Запрос списка товаров с текущими ценами")
+        
+        result = await price_manager.get_products_with_prices()
+        
+        if result.error:
+            logger.warning(f"Ошибка получения списка товаров с ценами: {result.message}")
+            return DefaultResponse(error=True, message=result.message, payload=None)
+        
+        logger.info(f"Успешно возвращено {len(result.payload)} товаров с ценами")
+        return result
+        
+    except Exception as e:
+        logger.error(f"Ошибка API при получении списка товаров с ценами: {str(e)}")
+        return DefaultResponse(
+            error=True,
+            message=f"Внутренняя ошибка сервера: {str(e)}",
+            payload=None
+        )
+
+@app.get("/products/{product_id}/prices", response_model=DefaultResponse[PageResponse[PriceHistoryResponse]])
+async def get_price_history(
+    product_id: int,
+    expand: bool = False,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to")
+) -> DefaultResponse[PageResponse[PriceHistoryResponse]]:
     try:
         logger.info(f"Запрос истории цен для товара: ID {product_id}")
         
-        result = await price_manager.get_price_history(product_id)
+        result = await price_manager.get_price_history_page(
+            product_id,
+            limit=limit,
+            cursor=cursor,
+            date_from=date_from,
+            date_to=date_to,
+            expand=expand
+        )
         
         if result.error:
             logger.warning(f"Ошибка получения истории цен: {result.message}")
@@ -159,7 +317,7 @@ async def get_price_history(product_id: int) -> DefaultResponse[List[PriceHistor
                 payload=None
             )
         
-        logger.info(f"Успешно возвращено {len(result.payload)} записей цен")
+        logger.info(f"Успешно возвращено {len(result.payload.items)} записей цен")
         return result
         
     except Exception as e:
@@ -170,6 +328,118 @@ async def get_price_history(product_id: int) -> DefaultResponse[List[PriceHistor
             payload=None
         )
 
+@app.get("/products/{product_id}/ohlc", response_model=DefaultResponse[List[PriceRollupResponse]])
+async def get_price_rollups(
+    product_id: int,
+    bucket: str = 'day',
+    date_from: Optional[datetime] = Query(None, alias="from"),
+    date_to: Optional[datetime] = Query(None, alias="to")
+) -> DefaultResponse[List[PriceRollupResponse]]:
+    try:
+        logger.info(f"Запрос агрегатов цен ({bucket}) для товара: ID {product_id}")
+        
+        result = await price_manager.get_price_rollups(product_id, bucket, date_from, date_to)
+        
+        if result.error:
+            logger.warning(f"Ошибка получения агрегатов цен: {result.message}")
+            return DefaultResponse(error=True, message=result.message, payload=None)
+        
+        return result
+        
+    except Exception as e:
+        logger.error(f"Ошибка API при получении агрегатов цен: {str(e)}")
+        return DefaultResponse(
+            error=True,
+            message=f"Внутренняя ошибка сервера: {str(e)}",
+            payload=None
+        )
+
+@app.get("/products/{product_id}/current-price", response_model=DefaultResponse[LatestPriceResponse])
+async def get_current_price(product_id: int) -> DefaultResponse[LatestPriceResponse]:
+    try:
+        result = await price_manager.get_latest_price(product_id)
+        
+        if result.error:
+            return DefaultResponse(error=True, message=result.message, payload=None)
+        
+        return result
+        
+    except Exception as e:
+        logger.error(f"Ошибка API при получении текущей цены: {str(e)}")
+        return DefaultResponse(
+            error=True,
+            message=f"Внутренняя ошибка сервера: {str(e)}",
+            payload=None
+        )
+
+@app.get("/crawl-jobs", response_model=DefaultResponse[List[CrawlJobResponse]])
+async def get_crawl_jobs(status: Optional[str] = None) -> DefaultResponse[List[CrawlJobResponse]]:
+    try:
+        logger.info(f"Запрос заданий обхода: статус {status or 'любой'}")
+        
+        result = await price_manager.get_crawl_jobs(status)
+        
+        if result.error:
+            logger.warning(f"Ошибка получения заданий обхода: {result.message}")
+            return DefaultResponse(error=True, message=result.message, payload=None)
+        
+        logger.info(f"Успешно возвращено {len(result.payload)} заданий обхода")
+        return result
+        
+    except Exception as e:
+        logger.error(f"Ошибка API при получении заданий обхода: {str(e)}")
+        return DefaultResponse(
+            error=True,
+            message=f"Внутренняя ошибка сервера: {str(e)}",
+            payload=None
+        )
+
+@app.post("/crawl-jobs/retry", response_model=DefaultResponse)
+async def retry_crawl_jobs(status: str = 'dead', host: Optional[str] = None) -> DefaultResponse:
+    try:
+        logger.info(f"Массовый перезапуск заданий обхода: статус {status}, хост {host or 'любой'}")
+        
+        result = await price_manager.requeue_crawl_jobs(status=status, host=host)
+        
+        if result.error:
+            logger.warning(f"Ошибка массового перезапуска заданий обхода: {result.message}")
+            return DefaultResponse(error=True, message=result.message, payload=None)
+        
+        return result
+        
+    except Exception as e:
+        logger.error(f"Ошибка API при массовом перезапуске заданий обхода: {str(e)}")
+        return DefaultResponse(
+            error=True,
+            message=f"Внутренняя ошибка сервера: {str(e)}",
+            payload=None
+        )
+
+@app.post("/crawl-jobs/{product_id}/retry", response_model=DefaultResponse)
+async def retry_crawl_job(product_id: int) -> DefaultResponse:
+    try:
+        logger.info(f"Перезапуск задания обхода: товар ID {product_id}")
+        
+        result = await price_manager.requeue_crawl_job(product_id)
+        
+        if result.error:
+            logger.warning(f"Ошибка перезапуска задания обхода: {result.message}")
+            return DefaultResponse(error=True, message=result.message, payload=None)
+        
+        return result
+        
+    except Exception as e:
+        logger.error(f"Ошибка API при перезапуске задания обхода: {str(e)}")
+        return DefaultResponse(
+            error=True,
+            message=f"Внутренняя ошибка сервера: {str(e)}",
+            payload=None
+        )
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics() -> PlainTextResponse:
+    return PlainTextResponse(registry.render())
+
 # @app.get("/health", response_model=DefaultResponse)
 # async def health_check() -> DefaultResponse:
 #     return DefaultResponse(
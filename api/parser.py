@@ -1,19 +1,49 @@
 import aiohttp
-from bs4 import BeautifulSoup
-import re
 import asyncio
+import multiprocessing
+import os
+import time
+from typing import Optional
+from urllib.parse import urlparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pagecache import ValidatorCache
+from extractors import get_extractor, extract_page, extract_listing_prices, empty_result, PriceStreamScanner
+from links import with_query_param
+from ratecontrol import HostRateController
+from archive import PageArchive
+from metrics import registry, FETCH_SECONDS, FETCH_REQUESTS, FETCH_RETRIES, PARSE_SECONDS, HTTP_POOL, HOST_LIMIT, HOST_IN_FLIGHT, HOST_CIRCUIT_OPEN
 from logger_config import setup_logger
+from config import settings
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    try:
+        import brotlicffi
+        BROTLI_AVAILABLE = True
+    except ImportError:
+        BROTLI_AVAILABLE = False
 
 logger = setup_logger(__name__)
 
 class XComParser:
     def __init__(self):
         self.session = None
+        self.cache = ValidatorCache() if settings.PARSER_CACHE_ENABLED else None
+        self.extractor = get_extractor(settings.PARSER_BACKEND)
+        self.executor = None
+        self.host_control = HostRateController()
+        self.archive = PageArchive() if settings.PAGE_ARCHIVE_ENABLED else None
+        self.connector = None
+        self.pool_counters = {'created': 0, 'reused': 0}
+        self.in_flight = 0
+        registry.add_collector(self.collect_metrics)
         self.headers = {
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
             'Accept-Language': 'ru-RU,ru;q=0.9,en-US;q=0.8,en;q=0.7',
-            'Accept-Encoding': 'gzip, deflate',
+            'Accept-Encoding': 'gzip, deflate, br' if BROTLI_AVAILABLE else 'gzip, deflate',
             'Connection': 'keep-alive',
             'Upgrade-Insecure-Requests': '1',
             'Sec-Fetch-Dest': 'document',
@@ -25,98 +55,299 @@ class XComParser:
 
     async def init_session(self):
         if not self.session:
-            self.session = aiohttp.ClientSession(headers=self.headers)
-            logger.info("Сессия aiohttp инициализирована")
-
-    async def get_product_full_info(self, link: str) -> dict:
-        result = {
-            'name': None,
-            'description': None,
-            'rating': None,
-            'price': None,
-            'reviews_count': None
-        }
+            self.connector = aiohttp.TCPConnector(
+                limit=settings.HTTP_POOL_LIMIT,
+                limit_per_host=settings.HTTP_POOL_LIMIT_PER_HOST,
+                keepalive_timeout=settings.HTTP_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=settings.HTTP_DNS_CACHE_TTL,
+                use_dns_cache=True,
+                enable_cleanup_closed=True
+            )
+            timeout = aiohttp.ClientTimeout(
+                total=settings.HTTP_TOTAL_TIMEOUT,
+                connect=settings.HTTP_CONNECT_TIMEOUT,
+                sock_read=settings.HTTP_READ_TIMEOUT
+            )
+            
+            trace_config = aiohttp.TraceConfig()
+            trace_config.on_connection_create_end.append(self.on_connection_created)
+            trace_config.on_connection_reuseconn.append(self.on_connection_reused)
+            
+            self.session = aiohttp.ClientSession(
+                headers=self.headers,
+                connector=self.connector,
+                timeout=timeout,
+                trace_configs=[trace_config]
+            )
+            logger.info(
+                f"Сессия aiohttp инициализирована (пул: {settings.HTTP_POOL_LIMIT}, "
+                f"на хост: {settings.HTTP_POOL_LIMIT_PER_HOST}, brotli: {'да' if BROTLI_AVAILABLE else 'нет'})"
+            )
+        if not self.executor:
+            self.executor = self.create_executor()
+
+    async def on_connection_created(self, session, context, params):
+        self.pool_counters['created'] += 1
+
+    async def on_connection_reused(self, session, context, params):
+        self.pool_counters['reused'] += 1
+
+    def pool_stats(self) -> dict:
+        stats = dict(self.pool_counters)
+        stats['limit'] = settings.HTTP_POOL_LIMIT
+        stats['in_use'] = self.in_flight
+        total = stats['created'] + stats['reused']
+        stats['reuse_ratio'] = round(stats['reused'] / total, 3) if total else None
+        return stats
+
+    def collect_metrics(self):
+        stats = self.pool_stats()
+        for state in ('created', 'reused', 'in_use'):
+            HTTP_POOL.set(stats[state], state=state)
+        
+        circuit_values = {'closed': 0, 'half_open': 0.5, 'open': 1}
+        for host in self.host_control.snapshot():
+            HOST_LIMIT.set(host['limit'], host=host['host'])
+            HOST_IN_FLIGHT.set(host['in_flight'], host=host['host'])
+            HOST_CIRCUIT_OPEN.set(circuit_values[host['circuit']], host=host['host'])
+
+    def create_executor(self):
+        workers = settings.PARSE_WORKERS or os.cpu_count() or 1
+        
+        if settings.PARSE_EXECUTOR == "process":
+            logger.info(f"Разбор страниц выполняется в пуле процессов ({workers})")
+            return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        if settings.PARSE_EXECUTOR == "thread":
+            logger.info(f"Разбор страниц выполняется в пуле потоков ({workers})")
+            return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="parse")
+        
+        logger.info("Разбор страниц выполняется в цикле событий")
+        return None
+
+    def extract_product_info(self, html: str) -> dict:
+        return self.extractor.extract(html)
+
+    async def parse_html(self, html: str) -> dict:
+        with PARSE_SECONDS.time(kind='product'):
+            if not self.executor:
+                return self.extract_product_info(html)
+            
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, extract_page, settings.PARSER_BACKEND, html)
+
+    async def fetch(self, link: str, headers: dict = None, scanner: PriceStreamScanner = None) -> dict:
+        host = urlparse(link).netloc
+        await self.host_control.acquire(host)
         
+        started = time.monotonic()
+        status = None
+        retry_after = None
+        self.in_flight += 1
+        try:
+            async with self.session.get(link, headers=headers) as response:
+                status = response.status
+                retry_after = response.headers.get('Retry-After')
+                
+                page = {
+                    'status': status,
+                    'body': None,
+                    'html': None,
+                    'price': None,
+                    'etag': response.headers.get('ETag'),
+                    'last_modified': response.headers.get('Last-Modified')
+                }
+                if status == 304:
+                    return page
+                
+                response.raise_for_status()
+                
+                if scanner:
+                    async for chunk in response.content.iter_chunked(settings.PRICE_STREAM_CHUNK_SIZE):
+                        page['price'] = scanner.feed(chunk)
+                        if page['price'] is not None:
+                            logger.info(f"Цена найдена после {scanner.size} байт, соединение закрыто: {link}")
+                            response.close()
+                            return page
+                    page['body'] = bytes(scanner.buffer)
+                else:
+                    page['body'] = await response.read()
+                
+                page['html'] = page['body'].decode(response.get_encoding(), errors='replace')
+                return page
+        except aiohttp.ClientResponseError:
+            raise
+        except Exception:
+            status = None
+            raise
+        finally:
+            self.in_flight -= 1
+            latency = time.monotonic() - started
+            FETCH_SECONDS.observe(latency, host=host)
+            FETCH_REQUESTS.inc(host=host, outcome='success' if status and status < 400 else 'failure')
+            await self.host_control.release(host, status, latency, retry_after)
+
+    async def parse_listing(self, html: str, url: str, wanted: set) -> dict:
+        args = (html, url, wanted, settings.LISTING_PRICE_CLASS, settings.LISTING_CARD_DEPTH)
+        with PARSE_SECONDS.time(kind='listing'):
+            if not self.executor:
+                return extract_listing_prices(*args)
+            
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, extract_listing_prices, *args)
+
+    async def get_listing_prices(self, listing_url: str, wanted: set) -> Optional[dict]:
         await self.init_session()
         
-        for attempt in range(3):
+        found = {}
+        try:
+            for page_number in range(1, settings.LISTING_MAX_PAGES + 1):
+                url = listing_url if page_number == 1 else with_query_param(listing_url, settings.LISTING_PAGE_PARAM, page_number)
+                page = await self.fetch(url)
+                prices = await self.parse_listing(page['html'], url, wanted - found.keys())
+                found.update(prices)
+                
+                logger.info(f"Страница каталога {url}: найдено {len(prices)} цен отслеживаемых товаров")
+                if not prices or wanted <= found.keys():
+                    break
+        except Exception as e:
+            logger.warning(f"Ошибка загрузки страницы каталога {listing_url}: {e}")
+            return found or None
+        
+        return found
+
+    async def archive_page(self, link: str, body: bytes):
+        if not self.archive or not body:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.archive.store, link, body)
+        except Exception as e:
+            logger.error(f"Ошибка сохранения страницы в архив: {e}")
+
+    async def get_product_full_info(self, link: str, attempts: int = None) -> dict:
+        attempts = attempts or settings.FETCH_ATTEMPTS
+        result = empty_result()
+        
+        await self.init_session()
+        
+        for attempt in range(attempts):
             try:
                 logger.info(f"Попытка {attempt + 1} получения информации: {link}")
                 
-                async with self.session.get(link, timeout=20) as response:
-                    response.raise_for_status()
-                    html = await response.text()
-                
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                try:
-                    title_element = soup.find('h1', {'id': 'card_main_title'})
-                    if title_element:
-                        title = title_element.get_text(strip=True)
-                        title = re.sub(r'<!--.*?-->', '', title)
-                        title = re.sub(r'\s+', ' ', title).strip()
-                        result['name'] = title
-                        logger.info(f"Название получено: {result['name']}")
-                except Exception as e:
-                    logger.error(f"Ошибка получения названия: {e}")
-            
-                try:
-                    price_element = soup.find('div', class_='card-content-total-price__current')
-                    if price_element:
-                        price_text = price_element.get_text(strip=True)
-                        price_clean = re.sub(r'[^\d]', '', price_text)
-                        if price_clean:
-                            result['price'] = float(price_clean)
-                            logger.info(f"Цена получена: {result['price']}")
-                except Exception as e:
-                    logger.error(f"Ошибка парсинга цены: {e}")
-                
-                try:
-                    rating_element = soup.find('span', class_='card-head-reviews-rating__value')
-                    if rating_element:
-                        rating_text = rating_element.get_text(strip=True)
-                        if rating_text:
-                            result['rating'] = float(rating_text)
-                            logger.info(f"Рейтинг получен: {result['rating']}")
-                except Exception as e:
-                    logger.error(f"Ошибка получения рейтинга: {e}")
-                
-                try:
-                    reviews_element = soup.find('div', class_='card-head-reviews-info__value')
-                    if reviews_element:
-                        reviews_text = reviews_element.get_text(strip=True)
-                        reviews_count = re.search(r'\d+', reviews_text)
-                        if reviews_count:
-                            result['reviews_count'] = int(reviews_count.group())
-                            logger.info(f"Количество отзывов: {result['reviews_count']}")
-                except Exception as e:
-                    logger.error(f"Ошибка получения отзывов: {e}")
+                headers = self.cache.conditional_headers(link) if self.cache else {}
+                cached = self.cache.get(link) if self.cache else None
+                
+                page = await self.fetch(link, headers)
+                
+                if page['status'] == 304 and cached:
+                    logger.info(f"Страница не изменилась (304), используем кэш: {link}")
+                    return dict(cached['result'])
+                
+                body = page['body']
+                html = page['html']
+                etag = page['etag']
+                last_modified = page['last_modified']
+                await self.archive_page(link, body)
+                
+                body_hash = ValidatorCache.body_hash(body)
+                if cached and cached.get('body_hash') == body_hash:
+                    logger.info(f"Содержимое страницы не изменилось, используем кэш: {link}")
+                    self.cache.store(link, etag, last_modified, body_hash, cached['result'])
+                    return dict(cached['result'])
+                
+                result = await self.parse_html(html)
                 
                 logger.info(f"Финальный результат парсинга: {result}")
                 
                 if any(result.values()):
+                    if self.cache:
+                        self.cache.store(link, etag, last_modified, body_hash, result)
                     return result
                 else:
                     logger.warning(f"Не удалось получить данные на попытке {attempt + 1}")
                     
             except Exception as e:
                 logger.warning(f"Попытка {attempt + 1} не удалась: {e}")
-                if attempt < 2:
-                    await asyncio.sleep(3)
+                if attempt < attempts - 1:
+                    FETCH_RETRIES.inc(host=urlparse(link).netloc)
+                    await asyncio.sleep(settings.FETCH_RETRY_DELAY)
                     continue
         
-        logger.warning(f"Не удалось получить данные после 3 попыток, возвращаем пустой результат")
+        logger.warning(f"Не удалось получить данные после {attempts} попыток, возвращаем пустой результат")
         return result
 
-    async def parse_price(self, link: str) -> float:
+    async def get_price_streaming(self, link: str, attempts: int = None) -> Optional[float]:
+        attempts = attempts or settings.FETCH_ATTEMPTS
+        
+        await self.init_session()
+        
+        for attempt in range(attempts):
+            try:
+                logger.info(f"Попытка {attempt + 1} получения цены: {link}")
+                
+                headers = self.cache.conditional_headers(link) if self.cache else {}
+                cached = self.cache.get(link) if self.cache else None
+                
+                page = await self.fetch(link, headers, scanner=PriceStreamScanner())
+                
+                if page['status'] == 304 and cached:
+                    logger.info(f"Страница не изменилась (304), используем кэш: {link}")
+                    return cached['result'].get('price')
+                
+                if page['price'] is not None:
+                    if self.cache:
+                        result = dict(cached['result']) if cached else {}
+                        result['price'] = page['price']
+                        self.cache.store(link, page['etag'], page['last_modified'], None, result)
+                    return page['price']
+                
+                logger.info(f"Блок цены не найден в потоке, разбираем страницу целиком: {link}")
+                await self.archive_page(link, page['body'])
+                result = await self.parse_html(page['html'])
+                
+                if result.get('price') is not None:
+                    if self.cache:
+                        self.cache.store(
+                            link,
+                            page['etag'],
+                            page['last_modified'],
+                            ValidatorCache.body_hash(page['body']),
+                            result
+                        )
+                    return result['price']
+                
+                logger.warning(f"Не удалось получить цену на попытке {attempt + 1}")
+                
+            except Exception as e:
+                logger.warning(f"Попытка {attempt + 1} не удалась: {e}")
+                if attempt < attempts - 1:
+                    FETCH_RETRIES.inc(host=urlparse(link).netloc)
+                    await asyncio.sleep(settings.FETCH_RETRY_DELAY)
+                    continue
+        
+        logger.warning(f"Не удалось получить цену после {attempts} попыток")
+        return None
+
+    async def parse_price(self, link: str, attempts: int = None) -> float:
         try:
-            info = await self.get_product_full_info(link)
+            if settings.PRICE_ONLY_STREAMING and not self.archive:
+                return await self.get_price_streaming(link, attempts=attempts)
+            
+            info = await self.get_product_full_info(link, attempts=attempts)
             return info.get('price')
         except Exception as e:
             logger.error(f"Ошибка получения цены товара: {e}")
             return None
 
+    def flush_cache(self):
+        if self.cache:
+            self.cache.flush()
+
     async def close(self):
+        self.flush_cache()
         if self.session:
             await self.session.close()
-            logger.info("Сессия aiohttp закрыта")
\ No newline at end of file
+            logger.info("Сессия aiohttp закрыта")
+        if self.executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
\ No newline at end of file
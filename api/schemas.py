@@ -1,7 +1,9 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Optional, List, Generic, TypeVar
 from datetime import datetime
 
+T = TypeVar('T')
+
 class ProductBase(BaseModel):
     link: str
     name: Optional[str] = None
@@ -11,8 +13,13 @@ class ProductBase(BaseModel):
 class ProductCreate(ProductBase):
     pass
 
+class ProductDeleteRequest(BaseModel):
+    product_ids: List[int]
+
 class ProductResponse(ProductBase):
     id: int
+    listing_url: Optional[str] = None
+    enrichment_status: str = 'done'
     
     class Config:
         from_attributes = True
@@ -22,13 +29,84 @@ class PriceHistoryResponse(BaseModel):
     product_id: int
     price: float
     created_at: datetime
+    last_seen_at: Optional[datetime] = None
+    observations: int = 1
+    
+    class Config:
+        from_attributes = True
+
+class LatestPriceResponse(BaseModel):
+    product_id: int
+    price: float
+    observed_at: datetime
+    changed_at: datetime
+    previous_price: Optional[float] = None
+    change_pct: Optional[float] = None
     
     class Config:
         from_attributes = True
 
+class PriceRollupResponse(BaseModel):
+    bucket_start: datetime
+    open: float
+    high: float
+    low: float
+    close: float
+    avg: float
+    observations: int
+    first_at: datetime
+    last_at: datetime
+
 class ProductWithPricesResponse(ProductResponse):
     price_history: List[PriceHistoryResponse] = []
     current_price: Optional[float] = None
+    price_changed_at: Optional[datetime] = None
+    change_pct: Optional[float] = None
     
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+class CrawlJobResponse(BaseModel):
+    id: int
+    product_id: int
+    status: str
+    attempts: int
+    next_run_at: Optional[datetime] = None
+    last_error: Optional[str] = None
+    updated_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class ImportJobResponse(BaseModel):
+    id: int
+    status: str
+    bytes_total: int
+    bytes_processed: int
+    rows_processed: int
+    inserted: int
+    duplicates: int
+    invalid: int
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class DeleteJobResponse(BaseModel):
+    id: int
+    status: str
+    total: int
+    processed: int
+    deleted: int
+    error: Optional[str] = None
+    created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    
+    class Config:
+        from_attributes = True
+
+class PageResponse(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None
\ No newline at end of file
@@ -1,4 +1,5 @@
 import asyncio
+import time
 from aiogram import Bot, Dispatcher, types, F
 from aiogram.filters import Command
 from aiogram.types import Message, CallbackQuery
@@ -74,13 +75,13 @@ class PriceMonitorBot:
 2. Отправьте ссылку на товар с сайта xcom-shop.ru
 
 <b>Мониторинг:</b>
-Цены автоматически обновляются каждые 60 минут
+Цены обновляются автоматически: часто меняющиеся товары проверяются каждые несколько минут, стабильные — раз в несколько часов
         """
         await message.answer(help_text, parse_mode="HTML")
     
     async def cmd_list_products(self, message: Message):
         try:
-            result = await self.price_manager.get_all_products()
+            result = await self.price_manager.get_products_with_prices()
             
             if result.error:
                 await message.answer(f"Ошибка: {result.message}")
@@ -94,8 +95,7 @@ class PriceMonitorBot:
             text = "<b>Отслеживаемые товары:</b>\n\n"
             
             for product in products:
-                current_price = await self.price_manager.get_current_price(product.id)
-                price_text = f"{current_price}₽" if current_price else "Нет данных"
+                price_text = f"{product.current_price}₽" if product.current_price is not None else "Нет данных"
                 
                 text += f"<b>ID:</b> {product.id}\n"
                 text += f"<b>Название:</b> {product.name or 'Без названия'}\n"
@@ -153,7 +153,11 @@ class PriceMonitorBot:
                     f"<b>ID:</b> {product.id}\n"
                     f"<b>Название:</b> {product.name or 'Без названия'}\n"
                     f"<b>Ссылка:</b> {product.link}\n\n"
-                    f"Цена будет обновлена при следующем запуске мониторинга",
+                    + (
+                        "Название и первая цена будут загружены в фоне в течение минуты"
+                        if product.enrichment_status == 'pending'
+                        else "Цена будет обновлена при следующем запуске мониторинга"
+                    ),
                     parse_mode="HTML"
                 )
             
@@ -342,8 +346,9 @@ class PriceMonitorBot:
     
     async def start(self):
         try:
+            started = time.perf_counter()
             await db_manager.initialize_database()
-            logger.info("Бот запускается...")
+            logger.info(f"Бот запускается... (холодный старт: {time.perf_counter() - started:.2f} с)")
             
             await self.dp.start_polling(self.bot)
             
@@ -0,0 +1,386 @@
+from datetime import datetime
+
+from sqlalchemy import text, select, insert, update, bindparam
+
+from models import Base, Product, SchemaVersion
+from links import normalize_link
+from partitions import ensure_future_partitions, next_month
+from config import settings
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+MIGRATION_LOCK_KEY = 72317001
+
+class Migration:
+    def __init__(self, version: int, name: str, statements: tuple = (), concurrent: tuple = (), handler=None):
+        self.version = version
+        self.name = name
+        self.statements = statements
+        self.concurrent = concurrent
+        self.handler = handler
+
+async def backfill_normalized_links(conn):
+    products_table = Product.__table__
+    last_id = 0
+    while True:
+        result = await conn.execute(
+            select(products_table.c.id, products_table.c.link)
+            .where(products_table.c.id > last_id, products_table.c.normalized_link.is_(None))
+            .order_by(products_table.c.id)
+            .limit(5000)
+        )
+        rows = result.all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+
+        params = []
+        for row in rows:
+            normalized = normalize_link(row.link)
+            if normalized:
+                params.append({'product_id': row.id, 'normalized': normalized})
+        if params:
+            await conn.execute(
+                update(products_table)
+                .where(products_table.c.id == bindparam('product_id'))
+                .values(normalized_link=bindparam('normalized')),
+                params
+            )
+
+MERGE_DUPLICATE_PRODUCTS = (
+    """
+    CREATE TEMPORARY TABLE duplicate_products ON COMMIT DROP AS
+    SELECT id, keep_id FROM (
+        SELECT id, min(id) OVER (PARTITION BY normalized_link) AS keep_id
+        FROM products
+        WHERE normalized_link IS NOT NULL
+    ) ranked
+    WHERE id <> keep_id
+    """,
+    "UPDATE price_history SET product_id = d.keep_id FROM duplicate_products d WHERE price_history.product_id = d.id",
+    "DELETE FROM crawl_jobs USING duplicate_products d WHERE crawl_jobs.product_id = d.id",
+    "DELETE FROM products USING duplicate_products d WHERE products.id = d.id",
+)
+
+async def merge_duplicate_products(conn):
+    await backfill_normalized_links(conn)
+    for statement in MERGE_DUPLICATE_PRODUCTS:
+        await conn.execute(text(statement))
+
+LATEST_PRICE_REFRESH = """
+    WITH history AS (
+        SELECT
+            product_id,
+            price,
+            created_at,
+            coalesce(last_seen_at, created_at) AS seen_at,
+            lag(price) OVER (PARTITION BY product_id ORDER BY created_at, id) AS previous_price,
+            row_number() OVER (PARTITION BY product_id ORDER BY created_at DESC, id DESC) AS position
+        FROM price_history
+        {where}
+    ),
+    changes AS (
+        SELECT DISTINCT ON (product_id) product_id, created_at AS changed_at, previous_price
+        FROM history
+        WHERE previous_price IS DISTINCT FROM price
+        ORDER BY product_id, created_at DESC
+    )
+    INSERT INTO latest_price (product_id, price, observed_at, changed_at, previous_price, change_pct)
+    SELECT
+        history.product_id,
+        history.price,
+        history.seen_at,
+        changes.changed_at,
+        changes.previous_price,
+        CASE WHEN changes.previous_price > 0
+            THEN (history.price - changes.previous_price) / changes.previous_price * 100
+        END
+    FROM history JOIN changes USING (product_id)
+    WHERE history.position = 1
+    ON CONFLICT (product_id) DO UPDATE SET
+        price = EXCLUDED.price,
+        observed_at = EXCLUDED.observed_at,
+        changed_at = EXCLUDED.changed_at,
+        previous_price = EXCLUDED.previous_price,
+        change_pct = EXCLUDED.change_pct
+"""
+
+ROLLUP_BUCKETS = ('hour', 'day', 'week', 'month')
+
+ROLLUP_REFRESH = """
+    WITH touched AS (
+        {touched}
+    ),
+    spans AS (
+        SELECT
+            h.product_id,
+            h.id,
+            h.price,
+            h.created_at,
+            coalesce(h.last_seen_at, h.created_at) AS seen_at,
+            h.observations,
+            touched.bucket_start,
+            touched.bucket_start + interval '1 {bucket}' AS bucket_end
+        FROM price_history h
+        JOIN touched
+            ON h.product_id = touched.product_id
+            AND h.created_at < touched.bucket_start + interval '1 {bucket}'
+            AND coalesce(h.last_seen_at, h.created_at) >= touched.bucket_start
+    ),
+    shares AS (
+        SELECT
+            spans.*,
+            CASE WHEN seen_at > created_at
+                THEN observations
+                    * extract(epoch FROM least(seen_at, bucket_end) - greatest(created_at, bucket_start))
+                    / extract(epoch FROM seen_at - created_at)
+                ELSE observations
+            END AS share,
+            CASE WHEN seen_at > created_at AND observations > 1
+                THEN greatest(0,
+                    least(observations - 1, ceil(
+                        extract(epoch FROM bucket_end - created_at) * (observations - 1)
+                        / extract(epoch FROM seen_at - created_at)
+                    ) - 1)
+                    - greatest(0, ceil(
+                        extract(epoch FROM bucket_start - created_at) * (observations - 1)
+                        / extract(epoch FROM seen_at - created_at)
+                    )) + 1
+                )
+                ELSE observations
+            END AS counted
+        FROM spans
+    )
+    INSERT INTO price_rollups (
+        product_id, bucket, bucket_start, open, high, low, close, total, weight, observations, first_at, last_at
+    )
+    SELECT
+        product_id,
+        '{bucket}',
+        bucket_start,
+        (array_agg(price ORDER BY created_at, id))[1],
+        max(price),
+        min(price),
+        (array_agg(price ORDER BY created_at DESC, id DESC))[1],
+        sum(price * share),
+        sum(share),
+        sum(counted)::integer,
+        min(greatest(created_at, bucket_start)),
+        max(least(seen_at, bucket_end - interval '1 microsecond'))
+    FROM shares
+    GROUP BY product_id, bucket_start
+    ON CONFLICT (product_id, bucket, bucket_start) DO UPDATE SET
+        open = EXCLUDED.open,
+        high = EXCLUDED.high,
+        low = EXCLUDED.low,
+        close = EXCLUDED.close,
+        total = EXCLUDED.total,
+        weight = EXCLUDED.weight,
+        observations = EXCLUDED.observations,
+        first_at = EXCLUDED.first_at,
+        last_at = EXCLUDED.last_at
+"""
+
+ROLLUP_TOUCHED_ALL = """
+        SELECT DISTINCT h.product_id, bucket_start
+        FROM price_history h,
+            generate_series(
+                date_trunc('{bucket}', h.created_at),
+                date_trunc('{bucket}', coalesce(h.last_seen_at, h.created_at)),
+                interval '1 {bucket}'
+            ) AS bucket_start
+"""
+
+ROLLUP_TOUCHED_RECENT = """
+        SELECT product_id, date_trunc('{bucket}', changed_at) AS bucket_start
+        FROM latest_price
+        WHERE product_id = ANY(:product_ids)
+        UNION
+        SELECT h.product_id, bucket_start
+        FROM price_history h,
+            generate_series(
+                date_trunc('{bucket}', greatest(h.created_at, :since)),
+                date_trunc('{bucket}', coalesce(h.last_seen_at, h.created_at)),
+                interval '1 {bucket}'
+            ) AS bucket_start
+        WHERE h.product_id = ANY(:product_ids) AND coalesce(h.last_seen_at, h.created_at) >= :since
+"""
+
+def rollup_statements(touched: str) -> tuple:
+    return tuple(
+        ROLLUP_REFRESH.format(bucket=bucket, touched=touched.format(bucket=bucket))
+        for bucket in ROLLUP_BUCKETS
+    )
+
+PARTITION_PRICE_HISTORY = (
+    "UPDATE price_history SET created_at = coalesce(last_seen_at, now() AT TIME ZONE 'utc') WHERE created_at IS NULL",
+    "ALTER TABLE price_history ALTER COLUMN created_at SET NOT NULL",
+    "ALTER TABLE price_history DROP CONSTRAINT price_history_pkey",
+    "ALTER TABLE price_history RENAME TO price_history_legacy",
+    "ALTER INDEX IF EXISTS ix_price_history_id RENAME TO price_history_legacy_id_idx",
+    "ALTER INDEX IF EXISTS ix_price_history_product_created RENAME TO price_history_legacy_product_created_idx",
+    "CREATE TABLE price_history (LIKE price_history_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)",
+    "ALTER TABLE price_history ADD CONSTRAINT price_history_pkey PRIMARY KEY (id, created_at)",
+    "ALTER TABLE price_history ADD CONSTRAINT price_history_product_id_fkey FOREIGN KEY (product_id) REFERENCES products (id)",
+    "ALTER SEQUENCE price_history_id_seq OWNED BY price_history.id",
+)
+
+async def partition_price_history(conn):
+    result = await conn.execute(text("SELECT max(created_at) FROM price_history"))
+    newest = max(result.scalar() or datetime.utcnow(), datetime.utcnow())
+    legacy_upper = next_month(newest)
+
+    for statement in PARTITION_PRICE_HISTORY:
+        await conn.execute(text(statement))
+    await conn.execute(text(
+        "ALTER TABLE price_history ATTACH PARTITION price_history_legacy "
+        f"FOR VALUES FROM (MINVALUE) TO ('{legacy_upper:%Y-%m-%d}')"
+    ))
+    await conn.execute(text("CREATE INDEX ix_price_history_id ON price_history (id)"))
+    await conn.execute(text(
+        "CREATE INDEX ix_price_history_product_created ON price_history (product_id, created_at DESC)"
+    ))
+
+CASCADE_FOREIGN_KEYS = (
+    "ALTER TABLE price_history DROP CONSTRAINT IF EXISTS price_history_product_id_fkey",
+    "ALTER TABLE price_history ADD CONSTRAINT price_history_product_id_fkey "
+    "FOREIGN KEY (product_id) REFERENCES products (id) ON DELETE CASCADE",
+) + tuple(
+    statement.format(table=table)
+    for table in ('crawl_jobs', 'latest_price', 'price_rollups')
+    for statement in (
+        "ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {table}_product_id_fkey",
+        "ALTER TABLE {table} ADD CONSTRAINT {table}_product_id_fkey "
+        "FOREIGN KEY (product_id) REFERENCES products (id) ON DELETE CASCADE NOT VALID",
+    )
+)
+
+VALIDATE_CASCADE_FOREIGN_KEYS = tuple(
+    (None, f"ALTER TABLE {table} VALIDATE CONSTRAINT {table}_product_id_fkey")
+    for table in ('crawl_jobs', 'latest_price', 'price_rollups')
+)
+
+MIGRATIONS = [
+    Migration(1, "baseline", statements=(
+        "ALTER TABLE price_history ADD COLUMN IF NOT EXISTS last_seen_at TIMESTAMP WITHOUT TIME ZONE",
+        "ALTER TABLE price_history ADD COLUMN IF NOT EXISTS observations INTEGER NOT NULL DEFAULT 1",
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS next_check_at TIMESTAMP WITHOUT TIME ZONE",
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS check_interval INTEGER",
+        "CREATE INDEX IF NOT EXISTS ix_products_next_check_at ON products (next_check_at)",
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS lease_owner VARCHAR",
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS lease_expires_at TIMESTAMP WITHOUT TIME ZONE",
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS listing_url VARCHAR",
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS enrichment_status VARCHAR NOT NULL DEFAULT 'done'",
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS enrichment_updated_at TIMESTAMP WITHOUT TIME ZONE",
+        "ALTER TABLE products ADD COLUMN IF NOT EXISTS normalized_link VARCHAR",
+        "CREATE INDEX IF NOT EXISTS ix_products_enrichment_queue ON products (id) WHERE enrichment_status IN ('pending', 'running')",
+    )),
+    Migration(2, "unique_normalized_link", handler=merge_duplicate_products, concurrent=(
+        ("ux_products_normalized_link", "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ux_products_normalized_link ON products (normalized_link)"),
+        (None, "DROP INDEX CONCURRENTLY IF EXISTS ix_products_normalized_link"),
+    )),
+    Migration(3, "price_history_product_created_index", concurrent=(
+        (
+            "ix_price_history_product_created",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_price_history_product_created "
+            "ON price_history (product_id, created_at DESC)"
+        ),
+    )),
+    Migration(4, "latest_price_backfill", statements=(
+        LATEST_PRICE_REFRESH.format(where=""),
+    )),
+    Migration(5, "price_rollups_backfill", statements=rollup_statements(ROLLUP_TOUCHED_ALL)),
+    Migration(6, "price_history_monthly_partitions", handler=partition_price_history),
+    Migration(7, "cascade_product_foreign_keys", statements=CASCADE_FOREIGN_KEYS),
+    Migration(8, "price_rollups_weight", statements=(
+        "ALTER TABLE price_rollups ADD COLUMN IF NOT EXISTS weight DOUBLE PRECISION",
+    ) + rollup_statements(ROLLUP_TOUCHED_ALL) + (
+        "UPDATE price_rollups SET weight = observations WHERE weight IS NULL",
+        "ALTER TABLE price_rollups ALTER COLUMN weight SET NOT NULL",
+    )),
+    Migration(9, "validate_cascade_product_foreign_keys", concurrent=VALIDATE_CASCADE_FOREIGN_KEYS),
+]
+
+async def drop_invalid_index(conn, name: str):
+    result = await conn.execute(
+        text("""
+            SELECT NOT i.indisvalid
+            FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = :name
+        """),
+        {'name': name}
+    )
+    if result.scalar():
+        logger.warning(f"Индекс {name} остался недостроенным после прошлой попытки, пересоздаем")
+        await conn.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+
+async def existing_tables(conn) -> set:
+    result = await conn.execute(text("SELECT tablename FROM pg_tables WHERE schemaname = 'public'"))
+    return {row.tablename for row in result}
+
+async def applied_versions(conn) -> set:
+    result = await conn.execute(select(SchemaVersion.version))
+    return {row.version for row in result}
+
+async def apply_migration(engine, lock_conn, migration: Migration):
+    started = datetime.utcnow()
+
+    async with engine.begin() as conn:
+        for statement in migration.statements:
+            await conn.execute(text(statement))
+        if migration.handler:
+            await migration.handler(conn)
+
+    for index_name, statement in migration.concurrent:
+        if index_name:
+            await drop_invalid_index(lock_conn, index_name)
+        await lock_conn.execute(text(statement))
+
+    async with engine.begin() as conn:
+        await conn.execute(insert(SchemaVersion).values(version=migration.version, name=migration.name, applied_at=datetime.utcnow()))
+
+    logger.info(
+        f"Применена миграция {migration.version} ({migration.name}) "
+        f"за {(datetime.utcnow() - started).total_seconds():.1f} с"
+    )
+
+async def run_migrations(engine):
+    async with engine.connect() as lock_conn:
+        lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+        await lock_conn.execute(text("SELECT pg_advisory_lock(:key)"), {'key': MIGRATION_LOCK_KEY})
+        try:
+            tables = await existing_tables(lock_conn)
+            existing_schema = 'products' in tables
+
+            if set(Base.metadata.tables) - tables:
+                async with engine.begin() as conn:
+                    await conn.run_sync(Base.metadata.create_all)
+
+            if not existing_schema:
+                async with engine.begin() as conn:
+                    await conn.execute(
+                        insert(SchemaVersion),
+                        [
+                            {'version': migration.version, 'name': migration.name, 'applied_at': datetime.utcnow()}
+                            for migration in MIGRATIONS
+                        ]
+                    )
+                logger.info(f"Создана новая схема базы данных, версия {MIGRATIONS[-1].version}")
+            else:
+                async with engine.connect() as conn:
+                    applied = await applied_versions(conn)
+
+                pending = [migration for migration in MIGRATIONS if migration.version not in applied]
+                for migration in pending:
+                    await apply_migration(engine, lock_conn, migration)
+
+                if pending:
+                    logger.info(f"Схема базы данных обновлена до версии {MIGRATIONS[-1].version}")
+                else:
+                    logger.info(f"Схема базы данных актуальна, версия {MIGRATIONS[-1].version}")
+
+            async with engine.begin() as conn:
+                await ensure_future_partitions(conn, settings.PARTITION_PRECREATE_MONTHS)
+        finally:
+            await lock_conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MIGRATION_LOCK_KEY})
@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Text, Index, text
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -10,18 +11,115 @@ class Product(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     link = Column(String, nullable=False)
+    normalized_link = Column(String, nullable=True)
     name = Column(String, nullable=True)
     description = Column(Text, nullable=True)
     rating = Column(Float, nullable=True)
+    next_check_at = Column(DateTime, nullable=True, index=True)
+    check_interval = Column(Integer, nullable=True)
+    lease_owner = Column(String, nullable=True)
+    lease_expires_at = Column(DateTime, nullable=True)
+    listing_url = Column(String, nullable=True)
+    enrichment_status = Column(String, nullable=False, default='done', server_default='done')
+    enrichment_updated_at = Column(DateTime, nullable=True)
     
-    price_history = relationship("PriceHistory", back_populates="product")
+    price_history = relationship("PriceHistory", back_populates="product", passive_deletes=True)
+    
+    __table_args__ = (
+        Index('ux_products_normalized_link', 'normalized_link', unique=True),
+        Index(
+            'ix_products_enrichment_queue',
+            'id',
+            postgresql_where=text("enrichment_status IN ('pending', 'running')")
+        ),
+    )
 
 class PriceHistory(Base):
     __tablename__ = 'price_history'
     
-    id = Column(Integer, primary_key=True, index=True)
-    product_id = Column(Integer, ForeignKey('products.id'))
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'))
     price = Column(Float, nullable=False)
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
+    last_seen_at = Column(DateTime, nullable=True)
+    observations = Column(Integer, nullable=False, default=1, server_default='1')
+    
+    product = relationship("Product", back_populates="price_history")
+    
+    __table_args__ = (
+        Index('ix_price_history_product_created', 'product_id', text('created_at DESC')),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
+
+class LatestPrice(Base):
+    __tablename__ = 'latest_price'
+    
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    price = Column(Float, nullable=False)
+    observed_at = Column(DateTime, nullable=False)
+    changed_at = Column(DateTime, nullable=False)
+    previous_price = Column(Float, nullable=True)
+    change_pct = Column(Float, nullable=True)
+
+class PriceRollup(Base):
+    __tablename__ = 'price_rollups'
+    
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), primary_key=True)
+    bucket = Column(String, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    open = Column(Float, nullable=False)
+    high = Column(Float, nullable=False)
+    low = Column(Float, nullable=False)
+    close = Column(Float, nullable=False)
+    total = Column(Float, nullable=False)
+    weight = Column(Float, nullable=False)
+    observations = Column(Integer, nullable=False)
+    first_at = Column(DateTime, nullable=False)
+    last_at = Column(DateTime, nullable=False)
+
+class CrawlJob(Base):
+    __tablename__ = 'crawl_jobs'
+    
+    id = Column(Integer, primary_key=True, index=True)
+    product_id = Column(Integer, ForeignKey('products.id', ondelete='CASCADE'), nullable=False, unique=True)
+    status = Column(String, nullable=False, default='retry')
+    attempts = Column(Integer, nullable=False, default=0)
+    next_run_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class ImportJob(Base):
+    __tablename__ = 'import_jobs'
+    
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, nullable=False, default='running')
+    bytes_total = Column(Integer, nullable=False, default=0)
+    bytes_processed = Column(Integer, nullable=False, default=0)
+    rows_processed = Column(Integer, nullable=False, default=0)
+    inserted = Column(Integer, nullable=False, default=0)
+    duplicates = Column(Integer, nullable=False, default=0)
+    invalid = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
     created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class DeleteJob(Base):
+    __tablename__ = 'delete_jobs'
+    
+    id = Column(Integer, primary_key=True, index=True)
+    status = Column(String, nullable=False, default='running')
+    product_ids = Column(ARRAY(Integer), nullable=False)
+    total = Column(Integer, nullable=False, default=0)
+    processed = Column(Integer, nullable=False, default=0)
+    deleted = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+class SchemaVersion(Base):
+    __tablename__ = 'schema_version'
     
-    product = relationship("Product", back_populates="price_history")
\ No newline at end of file
+    version = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime, default=datetime.utcnow)
\ No newline at end of file
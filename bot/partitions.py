@@ -0,0 +1,175 @@
+import re
+from datetime import datetime, timedelta
+
+from sqlalchemy import text
+
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+PARENT_TABLE = 'price_history'
+DEFAULT_PARTITION = f"{PARENT_TABLE}_default"
+MAINTENANCE_LOCK_KEY = 72317002
+BOUND_PATTERN = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+def month_start(value: datetime) -> datetime:
+    return datetime(value.year, value.month, 1)
+
+def next_month(value: datetime) -> datetime:
+    return datetime(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+def format_bound(value: datetime) -> str:
+    if value == datetime.min:
+        return 'MINVALUE'
+    if value == datetime.max:
+        return 'MAXVALUE'
+    return f"'{value.isoformat(sep=' ')}'"
+
+def parse_bound(value: str) -> datetime:
+    value = value.strip().strip("'")
+    if value == 'MINVALUE':
+        return datetime.min
+    if value == 'MAXVALUE':
+        return datetime.max
+    return datetime.fromisoformat(value)
+
+async def partition_bounds(conn) -> list:
+    result = await conn.execute(
+        text("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) AS bound
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = CAST(:parent AS regclass)
+            ORDER BY c.relname
+        """),
+        {'parent': PARENT_TABLE}
+    )
+    partitions = []
+    for row in result:
+        match = BOUND_PATTERN.search(row.bound or '')
+        if match:
+            partitions.append((row.relname, parse_bound(match.group(1)), parse_bound(match.group(2))))
+    return partitions
+
+async def ensure_default_partition(conn):
+    await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+
+async def has_default_partition(conn) -> bool:
+    result = await conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {'name': DEFAULT_PARTITION})
+    return bool(result.scalar())
+
+async def create_partition(conn, name: str, lower: datetime, upper: datetime, with_default: bool):
+    bounds = f"FROM ({format_bound(lower)}) TO ({format_bound(upper)})"
+    if not with_default:
+        await conn.execute(text(f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} FOR VALUES {bounds}"))
+        return
+
+    await conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS)"))
+    result = await conn.execute(
+        text(f"""
+            WITH moved AS (
+                DELETE FROM {DEFAULT_PARTITION}
+                WHERE created_at >= :lower AND created_at < :upper
+                RETURNING *
+            )
+            INSERT INTO {name} SELECT * FROM moved
+        """),
+        {'lower': lower, 'upper': upper}
+    )
+    if result.rowcount:
+        logger.warning(f"Из секции {DEFAULT_PARTITION} перенесено {result.rowcount} записей в {name}")
+    await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} FOR VALUES {bounds}"))
+
+async def ensure_partitions(conn, start: datetime, end: datetime) -> int:
+    existing = await partition_bounds(conn)
+    with_default = await has_default_partition(conn)
+    created = 0
+    lower = month_start(start)
+    while lower <= end:
+        upper = next_month(lower)
+        if not any(lower < part_upper and part_lower < upper for _, part_lower, part_upper in existing):
+            name = f"{PARENT_TABLE}_y{lower:%Y}m{lower:%m}"
+            await create_partition(conn, name, lower, upper, with_default)
+            existing.append((name, lower, upper))
+            created += 1
+        lower = upper
+
+    if created:
+        logger.info(f"Создано {created} месячных секций истории цен")
+    return created
+
+async def ensure_future_partitions(conn, months_ahead: int) -> int:
+    await ensure_default_partition(conn)
+    now = datetime.utcnow()
+    end = now
+    for _ in range(months_ahead):
+        end = next_month(end)
+    return await ensure_partitions(conn, now, end)
+
+def bounds_check(lower: datetime, upper: datetime) -> str:
+    conditions = []
+    if lower != datetime.min:
+        conditions.append(f"created_at >= {format_bound(lower)}")
+    if upper != datetime.max:
+        conditions.append(f"created_at < {format_bound(upper)}")
+    return ' AND '.join(conditions)
+
+async def downsample_partition(engine, name: str, lower: datetime, upper: datetime, keep_detached: bool) -> str:
+    daily_name = f"{name}_daily"
+    bounds = f"FROM ({format_bound(lower)}) TO ({format_bound(upper)})"
+
+    async with engine.begin() as conn:
+        await conn.execute(text(f"CREATE TABLE {daily_name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS)"))
+        await conn.execute(text(f"""
+            INSERT INTO {daily_name} (id, product_id, price, created_at, last_seen_at, observations)
+            SELECT
+                min(id),
+                product_id,
+                (array_agg(price ORDER BY created_at DESC, id DESC))[1],
+                min(created_at),
+                max(coalesce(last_seen_at, created_at)),
+                sum(observations)
+            FROM {name}
+            GROUP BY product_id, date_trunc('day', created_at)
+        """))
+        check = bounds_check(lower, upper)
+        if check:
+            await conn.execute(text(f"ALTER TABLE {daily_name} ADD CONSTRAINT {daily_name}_bounds CHECK ({check})"))
+        await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+        await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {daily_name} FOR VALUES {bounds}"))
+        if not keep_detached:
+            await conn.execute(text(f"DROP TABLE {name}"))
+
+    logger.info(f"Секция {name} прорежена до дневных значений{', исходная таблица отсоединена' if keep_detached else ''}")
+    return daily_name
+
+async def try_maintenance_lock(conn) -> bool:
+    result = await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {'key': MAINTENANCE_LOCK_KEY})
+    return bool(result.scalar())
+
+async def release_maintenance_lock(conn):
+    await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': MAINTENANCE_LOCK_KEY})
+
+async def apply_retention(engine, downsample_after_days: int, drop_after_days: int, keep_detached: bool) -> dict:
+    now = datetime.utcnow()
+    downsampled = 0
+    dropped = 0
+
+    async with engine.connect() as conn:
+        partitions = await partition_bounds(conn)
+
+    for name, lower, upper in partitions:
+        if drop_after_days and upper <= now - timedelta(days=drop_after_days):
+            async with engine.begin() as conn:
+                await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+                if not keep_detached:
+                    await conn.execute(text(f"DROP TABLE {name}"))
+            logger.info(f"Секция {name} удалена из истории цен по сроку хранения")
+            dropped += 1
+            continue
+
+        if downsample_after_days and not name.endswith('_daily') and upper <= now - timedelta(days=downsample_after_days):
+            await downsample_partition(engine, name, lower, upper, keep_detached)
+            downsampled += 1
+
+    return {'downsampled': downsampled, 'dropped': dropped}
@@ -0,0 +1,150 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+from logger_config import setup_logger
+from config import settings
+
+logger = setup_logger(__name__)
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+    except Exception:
+        return None
+
+class HostState:
+    def __init__(self, host: str):
+        self.host = host
+        self.limit = float(settings.HOST_CONCURRENCY_START)
+        self.in_flight = 0
+        self.circuit = 'closed'
+        self.paused_until = 0.0
+        self.consecutive_failures = 0
+        self.last_decrease = 0.0
+        self.latency = None
+        self.requests = 0
+        self.failures = 0
+        self.last_trip = 0.0
+        self.condition = asyncio.Condition()
+
+    def allowed(self) -> int:
+        if self.circuit == 'half_open':
+            return 1
+        return max(1, int(self.limit))
+
+    def snapshot(self) -> dict:
+        return {
+            'host': self.host,
+            'limit': round(self.limit, 2),
+            'in_flight': self.in_flight,
+            'circuit': self.circuit,
+            'paused_for': round(max(0.0, self.paused_until - time.monotonic()), 1),
+            'latency': round(self.latency, 3) if self.latency is not None else None,
+            'requests': self.requests,
+            'failures': self.failures
+        }
+
+class HostRateController:
+    def __init__(self):
+        self.hosts = {}
+
+    def state(self, host: str) -> HostState:
+        if host not in self.hosts:
+            self.hosts[host] = HostState(host)
+        return self.hosts[host]
+
+    async def acquire(self, host: str):
+        state = self.state(host)
+        async with state.condition:
+            while True:
+                delay = state.paused_until - time.monotonic()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(state.condition.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                if state.circuit == 'open':
+                    state.circuit = 'half_open'
+                    logger.info(f"Хост {host}: предохранитель полуоткрыт, пробный запрос")
+
+                if state.in_flight < state.allowed():
+                    state.in_flight += 1
+                    return
+
+                await state.condition.wait()
+
+    async def release(self, host: str, status: Optional[int], latency: float, retry_after: Optional[str] = None):
+        state = self.state(host)
+        state.in_flight -= 1
+        state.requests += 1
+        state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+
+        failed = status is None or status == 429 or status >= 500
+        slow = latency > settings.HOST_LATENCY_TARGET
+
+        if failed:
+            state.failures += 1
+            state.consecutive_failures += 1
+            self.decrease(state, f"ответ {status or 'ошибка соединения'}")
+        elif slow:
+            state.consecutive_failures = 0
+            self.decrease(state, f"задержка {latency:.1f} с")
+        else:
+            state.consecutive_failures = 0
+            state.limit = min(float(settings.CRAWL_PER_HOST_LIMIT), state.limit + 1 / state.limit)
+
+        pause = parse_retry_after(retry_after) if status in (429, 503) else None
+        if pause:
+            state.paused_until = max(state.paused_until, time.monotonic() + pause)
+            logger.warning(f"Хост {host}: Retry-After {pause:.0f} с, запросы приостановлены")
+
+        if state.circuit == 'half_open':
+            if failed:
+                self.trip(state)
+            else:
+                state.circuit = 'closed'
+                logger.info(f"Хост {host}: предохранитель закрыт, лимит {state.allowed()}")
+        elif failed and state.consecutive_failures >= settings.CIRCUIT_FAILURE_THRESHOLD:
+            self.trip(state)
+
+        async with state.condition:
+            state.condition.notify_all()
+
+    def decrease(self, state: HostState, reason: str):
+        now = time.monotonic()
+        if now - state.last_decrease < 1.0:
+            return
+        state.last_decrease = now
+        state.limit = max(float(settings.HOST_CONCURRENCY_MIN), state.limit / 2)
+        logger.warning(f"Хост {state.host}: {reason}, лимит параллельных запросов снижен до {state.allowed()}")
+
+    def trip(self, state: HostState):
+        state.circuit = 'open'
+        state.last_trip = time.monotonic()
+        state.paused_until = max(state.paused_until, time.monotonic() + settings.CIRCUIT_OPEN_SECONDS)
+        state.limit = float(settings.HOST_CONCURRENCY_MIN)
+        logger.error(
+            f"Хост {state.host}: предохранитель разомкнут после {state.consecutive_failures} ошибок подряд, "
+            f"пауза {settings.CIRCUIT_OPEN_SECONDS} с"
+        )
+
+    def degraded_hosts(self, since: float) -> set:
+        return {
+            host for host, state in self.hosts.items()
+            if state.circuit != 'closed' or state.last_trip >= since
+        }
+
+    def snapshot(self) -> list:
+        return [state.snapshot() for state in self.hosts.values()]
@@ -0,0 +1,57 @@
+import argparse
+import logging
+import statistics
+import time
+from pathlib import Path
+
+from extractors import available_backends
+
+def load_pages(paths) -> list:
+    pages = []
+    for path in paths:
+        path = Path(path)
+        files = sorted(path.glob("*.htm*")) if path.is_dir() else [path]
+        for file in files:
+            pages.append((file.name, file.read_text(encoding="utf-8", errors="replace")))
+    return pages
+
+def bench_page(extractor, html: str, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        extractor.extract(html)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Сравнение бэкендов разбора страниц xcom-shop")
+    arg_parser.add_argument("paths", nargs="+", help="Сохраненные HTML-страницы или каталоги с ними")
+    arg_parser.add_argument("--repeat", type=int, default=20, help="Количество прогонов на страницу")
+    args = arg_parser.parse_args()
+
+    logging.getLogger("extractors").setLevel(logging.WARNING)
+
+    pages = load_pages(args.paths)
+    if not pages:
+        print("Страницы не найдены")
+        return
+
+    backends = {name: backend() for name, backend in available_backends().items()}
+    totals = {name: [] for name in backends}
+
+    print(f"{'страница':<40}" + "".join(f"{name:>14}" for name in backends))
+    for page_name, html in pages:
+        row = f"{page_name[:40]:<40}"
+        for name, extractor in backends.items():
+            elapsed = bench_page(extractor, html, args.repeat)
+            totals[name].append(elapsed)
+            row += f"{elapsed * 1000:>11.2f} мс"
+        print(row)
+
+    print()
+    for name, timings in totals.items():
+        mean = statistics.mean(timings)
+        print(f"{name:<12} среднее: {mean * 1000:.2f} мс/стр, {1 / mean if mean else 0:.1f} стр/с")
+
+if __name__ == "__main__":
+    main()
@@ -19,6 +19,93 @@ class Settings(BaseSettings):
     DB_PASSWORD: str
     DB_NAME: str
     TELEGRAM_BOT_TOKEN: Optional[str] = None
+
+    DB_CONNECT_TIMEOUT: int = 60
+    DB_CONNECT_RETRY_MAX: float = 2.0
+
+    CRAWL_CONCURRENCY: int = 20
+    CRAWL_PER_HOST_LIMIT: int = 8
+    HOST_CONCURRENCY_MIN: int = 1
+    HOST_CONCURRENCY_START: int = 4
+    HOST_LATENCY_TARGET: float = 5.0
+    CIRCUIT_FAILURE_THRESHOLD: int = 5
+    CIRCUIT_OPEN_SECONDS: int = 60
+
+    HTTP_POOL_LIMIT: int = 100
+    HTTP_POOL_LIMIT_PER_HOST: int = 16
+    HTTP_KEEPALIVE_TIMEOUT: float = 30.0
+    HTTP_DNS_CACHE_TTL: int = 300
+    HTTP_CONNECT_TIMEOUT: float = 5.0
+    HTTP_READ_TIMEOUT: float = 15.0
+    HTTP_TOTAL_TIMEOUT: float = 20.0
+
+    PARSER_CACHE_ENABLED: bool = True
+    PARSER_CACHE_PATH: str = "cache/validators.json"
+    PARSER_CACHE_FLUSH_EVERY: int = 500
+    PARSER_BACKEND: str = "lxml"
+    PARSE_EXECUTOR: str = "process"
+    PARSE_WORKERS: int = 0
+    FETCH_ATTEMPTS: int = 3
+    FETCH_RETRY_DELAY: int = 3
+    PRICE_ONLY_STREAMING: bool = True
+    PRICE_STREAM_CHUNK_SIZE: int = 16384
+
+    PAGE_ARCHIVE_ENABLED: bool = False
+    PAGE_ARCHIVE_PATH: str = "archive"
+    PAGE_ARCHIVE_RETENTION_DAYS: int = 30
+    PAGE_ARCHIVE_LEVEL: int = 6
+
+    ENRICHMENT_MODE: str = "background"
+    ENRICHMENT_CONCURRENCY: int = 8
+    ENRICHMENT_BATCH_SIZE: int = 50
+    ENRICHMENT_POLL_INTERVAL: int = 30
+
+    PAGE_SIZE_DEFAULT: int = 100
+    PAGE_SIZE_MAX: int = 1000
+
+    METRICS_ENABLED: bool = True
+    METRICS_PORT: int = 9100
+
+    IMPORT_BATCH_SIZE: int = 1000
+    IMPORT_SPOOL_PATH: str = "imports"
+
+    PARTITION_PRECREATE_MONTHS: int = 3
+    HISTORY_RAW_RETENTION_DAYS: int = 90
+    HISTORY_DROP_AFTER_DAYS: int = 0
+    PARTITION_KEEP_DETACHED: bool = False
+
+    DELETE_BATCH_SIZE: int = 100
+    DELETE_ASYNC_THRESHOLD: int = 100000
+
+    LISTING_CRAWL_ENABLED: bool = False
+    LISTING_MIN_PRODUCTS: int = 2
+    LISTING_MAX_PAGES: int = 5
+    LISTING_PAGE_PARAM: str = "page"
+    LISTING_PRICE_CLASS: str = "price"
+    LISTING_CARD_DEPTH: int = 6
+
+    PRICE_BATCH_SIZE: int = 1000
+    PRICE_FLUSH_INTERVAL: int = 30
+    PRICE_FLUSH_BACKOFF_MAX: int = 300
+    PRICE_BUFFER_MAX_RECORDS: int = 50000
+    PRICE_STORAGE_MODE: str = "append"
+
+    SCHEDULER_MODE: str = "adaptive"
+    SCHEDULER_TICK_SECONDS: int = 60
+    SCHEDULER_BATCH_SIZE: int = 2000
+    CHECK_INTERVAL_MIN: int = 300
+    CHECK_INTERVAL_MAX: int = 21600
+    VOLATILITY_WINDOW_DAYS: int = 7
+    FIXED_CHECK_INTERVAL: int = 3600
+
+    WORKER_ID: Optional[str] = None
+    LEASE_TTL_SECONDS: int = 900
+
+    MONITOR_FETCH_ATTEMPTS: int = 1
+    CRAWL_MAX_ATTEMPTS: int = 6
+    RETRY_BASE_DELAY: int = 60
+    RETRY_MAX_DELAY: int = 3600
+    DEAD_JOB_REPROBE_HOURS: int = 24
     
     @property
     def DATABASE_URL(self) -> str:
@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+from logger_config import setup_logger
+from config import settings
+
+logger = setup_logger(__name__)
+
+class CrawlEngine:
+    def __init__(self, concurrency: int = None):
+        self.concurrency = concurrency or settings.CRAWL_CONCURRENCY
+
+    async def worker(self, queue: asyncio.Queue, handler, stats: dict):
+        while True:
+            product = await queue.get()
+            try:
+                success = await handler(product)
+                if success:
+                    stats['succeeded'] += 1
+                    stats['succeeded_ids'].append(product.id)
+                else:
+                    stats['failed'] += 1
+                    stats['errors'][product.id] = "Не удалось получить цену"
+            except Exception as e:
+                stats['failed'] += 1
+                stats['errors'][product.id] = str(e)
+                logger.error(f"Ошибка обработки товара {product.id} в очереди обхода: {str(e)}")
+            finally:
+                queue.task_done()
+
+    async def run(self, products, handler) -> dict:
+        stats = {'total': len(products), 'succeeded': 0, 'failed': 0, 'succeeded_ids': [], 'errors': {}}
+
+        queue = asyncio.Queue()
+        for product in products:
+            queue.put_nowait(product)
+
+        started = time.monotonic()
+        workers = [
+            asyncio.create_task(self.worker(queue, handler, stats))
+            for _ in range(min(self.concurrency, len(products)))
+        ]
+
+        try:
+            await queue.join()
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        elapsed = time.monotonic() - started
+        stats['elapsed'] = elapsed
+        stats['throughput'] = stats['total'] / elapsed if elapsed > 0 else 0.0
+
+        logger.info(
+            f"Обход завершен: {stats['total']} товаров за {elapsed:.1f} с "
+            f"({stats['throughput']:.2f} товаров/с), успешно: {stats['succeeded']}, "
+            f"ошибок: {stats['failed']}, параллельность: {self.concurrency}"
+        )
+        return stats
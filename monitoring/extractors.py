@@ -0,0 +1,270 @@
+import re
+from typing import Optional
+from urllib.parse import urlparse
+from bs4 import BeautifulSoup
+from links import normalize_link
+from logger_config import setup_logger
+
+try:
+    from lxml import html as lxml_html
+except ImportError:
+    lxml_html = None
+
+try:
+    from selectolax.parser import HTMLParser
+except ImportError:
+    HTMLParser = None
+
+logger = setup_logger(__name__)
+
+TITLE_ID = 'card_main_title'
+PRICE_CLASS = 'card-content-total-price__current'
+RATING_CLASS = 'card-head-reviews-rating__value'
+REVIEWS_CLASS = 'card-head-reviews-info__value'
+
+BREADCRUMB_SELECTOR = '[class*="breadcrumb"] a[href]'
+BREADCRUMB_XPATH = '//*[contains(@class, "breadcrumb")]//a/@href'
+
+PRICE_BLOCK_PATTERN = re.compile(
+    rb'class="(?:[^"]*\s)?' + PRICE_CLASS.encode() + rb'(?:\s[^"]*)?"[^>]*>(.*?)</div>',
+    re.S
+)
+
+def empty_result() -> dict:
+    return {
+        'name': None,
+        'description': None,
+        'rating': None,
+        'price': None,
+        'reviews_count': None,
+        'category_url': None
+    }
+
+def xpath_class(tag: str, class_name: str) -> str:
+    return f'//{tag}[contains(concat(" ", normalize-space(@class), " "), " {class_name} ")]'
+
+class BaseExtractor:
+    name = None
+
+    def find_texts(self, html: str) -> dict:
+        raise NotImplementedError
+
+    def extract(self, html: str) -> dict:
+        result = empty_result()
+        texts = self.find_texts(html)
+
+        try:
+            title = texts.get('name')
+            if title:
+                title = re.sub(r'<!--.*?-->', '', title)
+                title = re.sub(r'\s+', ' ', title).strip()
+                result['name'] = title
+                logger.info(f"Название получено: {result['name']}")
+        except Exception as e:
+            logger.error(f"Ошибка получения названия: {e}")
+
+        try:
+            price_text = texts.get('price')
+            if price_text:
+                price_clean = re.sub(r'[^\d]', '', price_text)
+                if price_clean:
+                    result['price'] = float(price_clean)
+                    logger.info(f"Цена получена: {result['price']}")
+        except Exception as e:
+            logger.error(f"Ошибка парсинга цены: {e}")
+
+        try:
+            rating_text = texts.get('rating')
+            if rating_text:
+                result['rating'] = float(rating_text)
+                logger.info(f"Рейтинг получен: {result['rating']}")
+        except Exception as e:
+            logger.error(f"Ошибка получения рейтинга: {e}")
+
+        try:
+            reviews_text = texts.get('reviews_count')
+            if reviews_text:
+                reviews_count = re.search(r'\d+', reviews_text)
+                if reviews_count:
+                    result['reviews_count'] = int(reviews_count.group())
+                    logger.info(f"Количество отзывов: {result['reviews_count']}")
+        except Exception as e:
+            logger.error(f"Ошибка получения отзывов: {e}")
+
+        result['category_url'] = texts.get('category_url')
+
+        return result
+
+class BeautifulSoupExtractor(BaseExtractor):
+    name = 'bs4'
+
+    def find_texts(self, html: str) -> dict:
+        soup = BeautifulSoup(html, 'html.parser')
+        elements = {
+            'name': soup.find('h1', {'id': TITLE_ID}),
+            'price': soup.find('div', class_=PRICE_CLASS),
+            'rating': soup.find('span', class_=RATING_CLASS),
+            'reviews_count': soup.find('div', class_=REVIEWS_CLASS)
+        }
+        texts = {
+            key: element.get_text(strip=True) if element else None
+            for key, element in elements.items()
+        }
+        breadcrumbs = soup.select(BREADCRUMB_SELECTOR)
+        texts['category_url'] = breadcrumbs[-1].get('href') if breadcrumbs else None
+        return texts
+
+class LxmlExtractor(BaseExtractor):
+    name = 'lxml'
+
+    queries = {
+        'name': f'//h1[@id="{TITLE_ID}"]',
+        'price': xpath_class('div', PRICE_CLASS),
+        'rating': xpath_class('span', RATING_CLASS),
+        'reviews_count': xpath_class('div', REVIEWS_CLASS)
+    }
+
+    def find_texts(self, html: str) -> dict:
+        tree = lxml_html.fromstring(html)
+        texts = {}
+        for key, query in self.queries.items():
+            elements = tree.xpath(query)
+            texts[key] = elements[0].text_content().strip() if elements else None
+        breadcrumbs = tree.xpath(BREADCRUMB_XPATH)
+        texts['category_url'] = breadcrumbs[-1] if breadcrumbs else None
+        return texts
+
+class SelectolaxExtractor(BaseExtractor):
+    name = 'selectolax'
+
+    selectors = {
+        'name': f'h1#{TITLE_ID}',
+        'price': f'div.{PRICE_CLASS}',
+        'rating': f'span.{RATING_CLASS}',
+        'reviews_count': f'div.{REVIEWS_CLASS}'
+    }
+
+    def find_texts(self, html: str) -> dict:
+        tree = HTMLParser(html)
+        texts = {}
+        for key, selector in self.selectors.items():
+            element = tree.css_first(selector)
+            texts[key] = element.text(strip=True) if element else None
+        breadcrumbs = tree.css(BREADCRUMB_SELECTOR)
+        texts['category_url'] = breadcrumbs[-1].attributes.get('href') if breadcrumbs else None
+        return texts
+
+class FallbackExtractor(BaseExtractor):
+    def __init__(self, primary: BaseExtractor, fallback: BaseExtractor):
+        self.primary = primary
+        self.fallback = fallback
+        self.name = primary.name
+
+    def find_texts(self, html: str) -> dict:
+        try:
+            return self.primary.find_texts(html)
+        except Exception as e:
+            logger.warning(f"Бэкенд {self.primary.name} не смог разобрать страницу, используем {self.fallback.name}: {e}")
+            return self.fallback.find_texts(html)
+
+def available_backends() -> dict:
+    backends = {'bs4': BeautifulSoupExtractor}
+    if lxml_html is not None:
+        backends['lxml'] = LxmlExtractor
+    if HTMLParser is not None:
+        backends['selectolax'] = SelectolaxExtractor
+    return backends
+
+def get_extractor(name: str) -> BaseExtractor:
+    backends = available_backends()
+    if name not in backends:
+        logger.warning(f"Бэкенд разбора HTML '{name}' недоступен, используется bs4")
+        return BeautifulSoupExtractor()
+    if name == 'bs4':
+        return BeautifulSoupExtractor()
+    return FallbackExtractor(backends[name](), BeautifulSoupExtractor())
+
+class PriceStreamScanner:
+    def __init__(self, overlap: int = 2048):
+        self.buffer = bytearray()
+        self.position = 0
+        self.overlap = overlap
+
+    def feed(self, chunk: bytes) -> Optional[float]:
+        self.buffer.extend(chunk)
+        match = PRICE_BLOCK_PATTERN.search(self.buffer, self.position)
+        if match:
+            price_text = re.sub(rb'<[^>]*>|&#?\w+;', b'', match.group(1))
+            price_clean = re.sub(rb'[^\d]', b'', price_text)
+            if price_clean:
+                return float(price_clean)
+        self.position = max(0, len(self.buffer) - self.overlap)
+        return None
+
+    @property
+    def size(self) -> int:
+        return len(self.buffer)
+
+extractor_cache = {}
+
+def extract_page(backend: str, html: str) -> dict:
+    extractor = extractor_cache.get(backend)
+    if extractor is None:
+        extractor = extractor_cache[backend] = get_extractor(backend)
+    return extractor.extract(html)
+
+
+REJECTED_PRICE_MARKERS = ('old', 'discount', 'percent', 'badge')
+
+def same_host(link: Optional[str], base_url: str) -> bool:
+    return bool(link) and urlparse(link).netloc == urlparse(base_url).netloc
+
+def find_card(anchor, link: str, base_url: str, depth: int):
+    card = None
+    element = anchor
+    for _ in range(depth):
+        element = element.getparent()
+        if element is None:
+            break
+        others = (
+            normalize_link(other.get('href'), base=base_url)
+            for other in element.iter('a')
+        )
+        if any(other != link and same_host(other, base_url) for other in others):
+            break
+        card = element
+    return card
+
+def is_rejected_price(candidate) -> bool:
+    text = candidate.text_content()
+    if '%' in text:
+        return True
+    classes = candidate.get('class', '').lower()
+    return any(marker in classes for marker in REJECTED_PRICE_MARKERS)
+
+def find_card_price(anchor, link: str, base_url: str, price_class: str, depth: int) -> Optional[float]:
+    card = find_card(anchor, link, base_url, depth)
+    if card is None:
+        return None
+    for candidate in card.xpath(f'.//*[contains(concat(" ", normalize-space(@class), " "), " {price_class} ")]'):
+        if is_rejected_price(candidate):
+            continue
+        digits = re.sub(r'[^\d]', '', candidate.text_content())
+        if digits:
+            return float(digits)
+    return None
+
+def extract_listing_prices(html: str, base_url: str, wanted: set, price_class: str = 'price', depth: int = 6) -> dict:
+    if lxml_html is None or not html:
+        return {}
+
+    tree = lxml_html.fromstring(html)
+    found = {}
+    for anchor in tree.iter('a'):
+        link = normalize_link(anchor.get('href'), base=base_url)
+        if link not in wanted or link in found:
+            continue
+        price = find_card_price(anchor, link, base_url, price_class, depth)
+        if price is not None:
+            found[link] = price
+    return found
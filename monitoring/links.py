@@ -0,0 +1,33 @@
+from typing import Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, urljoin
+
+TRACKING_PARAMS = {'gclid', 'yclid', 'fbclid', 'from', 'ref', '_openstat'}
+
+def normalize_link(link: str, base: Optional[str] = None) -> Optional[str]:
+    if not link:
+        return None
+
+    link = link.strip()
+    if base:
+        link = urljoin(base, link)
+
+    parts = urlsplit(link)
+    if parts.scheme not in ('http', 'https') or not parts.netloc:
+        return None
+
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.startswith('utm_') and key not in TRACKING_PARAMS
+    )
+    path = parts.path or '/'
+    if path != '/':
+        path = path.rstrip('/')
+
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), ''))
+
+def with_query_param(link: str, key: str, value) -> str:
+    parts = urlsplit(link)
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k != key]
+    query.append((key, str(value)))
+    return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), parts.fragment))
@@ -0,0 +1,86 @@
+import asyncio
+import time
+from collections import defaultdict
+
+from links import normalize_link
+from logger_config import setup_logger
+from config import settings
+
+logger = setup_logger(__name__)
+
+class ListingPlanner:
+    def __init__(self, parser, price_manager, price_buffer):
+        self.parser = parser
+        self.price_manager = price_manager
+        self.price_buffer = price_buffer
+        self.pending_discovery = set()
+        self.discovered = {}
+
+    def needs_discovery(self, product) -> bool:
+        return product.id in self.pending_discovery
+
+    def discover(self, product, category_url):
+        listing_url = normalize_link(category_url, base=product.link)
+        if listing_url != product.listing_url:
+            self.discovered[product.id] = listing_url
+
+    async def harvest_group(self, listing_url: str, group: list, stats: dict) -> list:
+        wanted = {normalize_link(product.link): product for product in group}
+        prices = await self.parser.get_listing_prices(listing_url, set(wanted))
+        if prices is None:
+            return group
+
+        missed = []
+        for link, product in wanted.items():
+            price = prices.get(link)
+            if price is None:
+                self.pending_discovery.add(product.id)
+                missed.append(product)
+                continue
+            await self.price_buffer.add(product.id, price)
+            stats['succeeded_ids'].append(product.id)
+        return missed
+
+    async def harvest(self, products: list) -> dict:
+        self.pending_discovery = set()
+        self.discovered = {}
+        stats = {'listings': 0, 'succeeded_ids': [], 'remaining': []}
+
+        groups = defaultdict(list)
+        for product in products:
+            if product.listing_url:
+                groups[product.listing_url].append(product)
+            else:
+                self.pending_discovery.add(product.id)
+                stats['remaining'].append(product)
+
+        harvestable = {}
+        for listing_url, group in groups.items():
+            if len(group) >= settings.LISTING_MIN_PRODUCTS:
+                harvestable[listing_url] = group
+            else:
+                stats['remaining'].extend(group)
+
+        started = time.monotonic()
+        results = await asyncio.gather(
+            *(self.harvest_group(listing_url, group, stats) for listing_url, group in harvestable.items()),
+            return_exceptions=True
+        )
+        for (listing_url, group), result in zip(harvestable.items(), results):
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка обхода страницы каталога {listing_url}: {str(result)}")
+                stats['remaining'].extend(group)
+            else:
+                stats['remaining'].extend(result)
+        stats['listings'] = len(harvestable)
+
+        logger.info(
+            f"Обход каталогов: {len(harvestable)} страниц, цены получены для {len(stats['succeeded_ids'])} "
+            f"товаров за {time.monotonic() - started:.1f} с, на покарточную проверку: {len(stats['remaining'])}"
+        )
+        return stats
+
+    async def save_discovered(self):
+        if self.discovered:
+            await self.price_manager.set_listing_urls(self.discovered)
+        self.discovered = {}
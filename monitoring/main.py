@@ -1,9 +1,22 @@
 import asyncio
+import os
+import signal
+import socket
+import time
+from datetime import datetime
+from urllib.parse import urlparse
+from aiohttp import web
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from parser import XComParser as PriceParser
 from database import db_manager
 from pricemanager import PriceManager
+from crawler import CrawlEngine
+from pricebuffer import PriceHistoryBuffer
+from listings import ListingPlanner
+from enrichment import EnrichmentWorker
+from metrics import registry, CYCLE_SECONDS, CYCLE_PRODUCTS
 from logger_config import setup_logger
+from config import settings
 
 logger = setup_logger(__name__)
 
@@ -11,6 +24,12 @@ class MonitoringService:
     def __init__(self):
         self.parser = None
         self.price_manager = None
+        self.price_buffer = None
+        self.listings = None
+        self.enrichment_worker = None
+        self.metrics_runner = None
+        self.crawler = CrawlEngine()
+        self.worker_id = settings.WORKER_ID or f"{socket.gethostname()}:{os.getpid()}"
         self.scheduler = AsyncIOScheduler()
     
     async def initialize(self):
@@ -21,9 +40,16 @@ class MonitoringService:
         
         self.parser = PriceParser()
         self.price_manager = PriceManager(parser=self.parser)
+        self.price_buffer = PriceHistoryBuffer(self.price_manager)
+        self.listings = ListingPlanner(self.parser, self.price_manager, self.price_buffer)
+        if settings.ENRICHMENT_MODE == "background":
+            self.enrichment_worker = EnrichmentWorker(self.price_manager)
         
         await self.parser.init_session()
         
+        if settings.METRICS_ENABLED:
+            await self.start_metrics_server()
+        
         logger.info("Сервис мониторинга инициализирован")
         return True
     
@@ -32,75 +58,199 @@ class MonitoringService:
             logger.info(f"Начинаем парсинг товара: {product.name}")
             logger.info(f"Ссылка: {product.link}")
             
-            price = await self.parser.parse_price(product.link)
+            if settings.LISTING_CRAWL_ENABLED and self.listings.needs_discovery(product):
+                info = await self.parser.get_product_full_info(product.link, attempts=settings.MONITOR_FETCH_ATTEMPTS)
+                price = info.get('price')
+                if any(info.values()):
+                    self.listings.discover(product, info.get('category_url'))
+            else:
+                price = await self.parser.parse_price(product.link, attempts=settings.MONITOR_FETCH_ATTEMPTS)
             
             logger.info(f"Результат парсинга: {price}")
             
             if price is not None:
-                result = await self.price_manager.add_price_history(product.id, price)
-                if result.error:
-                    logger.error(f"Ошибка сохранения цены для товара {product.name}: {result.message}")
-                else:
-                    logger.info(f"Цена {price}₽ сохранена для товара {product.name}")
-            else:
-                logger.warning(f"Не удалось получить цену для товара {product.name}")
+                await self.price_buffer.add(product.id, price)
+                logger.info(f"Цена {price}₽ добавлена в буфер для товара {product.name}")
+                return True
+            
+            logger.warning(f"Не удалось получить цену для товара {product.name}")
+            return False
                 
         except Exception as e:
             logger.error(f"Ошибка обработки товара {product.name}: {str(e)}")
             logger.exception(e)
+            raise
     
     async def monitor_prices(self):
         try:
-            logger.info("Запуск задачи мониторинга цен")
-            
-            products_response = await self.price_manager.get_all_products()
+            products_response = await self.price_manager.claim_due_products(
+                settings.SCHEDULER_BATCH_SIZE,
+                self.worker_id
+            )
             
             if products_response.error:
-                logger.error("Ошибка получения списка товаров")
+                logger.error("Ошибка получения товаров к проверке")
                 return
             
             products = products_response.payload
-            logger.info(f"Найдено {len(products)} товаров для мониторинга")
+            if not products:
+                return
             
-            for product in products:
-                await self.process_product(product)
-                
-            logger.info("Задача мониторинга цен завершена")
+            logger.info(f"Запуск задачи мониторинга цен: {len(products)} товаров к проверке")
+            started = time.perf_counter()
+            cycle_started_at = datetime.utcnow()
+            
+            heartbeat = asyncio.create_task(self.renew_leases())
+            try:
+                await self.process_cycle(products, started, cycle_started_at)
+            finally:
+                heartbeat.cancel()
+                await asyncio.gather(heartbeat, return_exceptions=True)
             
         except Exception as e:
             logger.error(f"Критическая ошибка в задаче мониторинга: {str(e)}")
     
-    def start(self):
-        asyncio.create_task(self.monitor_prices())
+    async def renew_leases(self):
+        while True:
+            await asyncio.sleep(settings.LEASE_TTL_SECONDS / 3)
+            await self.price_manager.renew_leases(self.worker_id)
+    
+    async def process_cycle(self, products, started: float, cycle_started_at: datetime):
+        crawl_started = time.monotonic()
+        hosts = {product.id: urlparse(product.link).netloc for product in products}
+        harvested_ids = []
+        if settings.LISTING_CRAWL_ENABLED:
+            listing_stats = await self.listings.harvest(products)
+            harvested_ids = listing_stats['succeeded_ids']
+            products = listing_stats['remaining']
+        
+        stats = await self.crawler.run(products, self.process_product)
+        flushed = await self.price_buffer.flush()
+        self.parser.flush_cache()
+        if settings.LISTING_CRAWL_ENABLED:
+            await self.listings.save_discovered()
+        
+        for host in self.parser.host_control.snapshot():
+            logger.info(f"Состояние хоста: {host}")
+        logger.info(f"Пул соединений: {self.parser.pool_stats()}")
+        
+        if flushed:
+            await self.price_manager.reschedule_products(harvested_ids + stats['succeeded_ids'])
+        else:
+            logger.warning(
+                "Цены цикла еще не сохранены в базу, перенос проверок и обновление агрегатов отложены "
+                "до истечения аренды товаров"
+            )
+        degraded = self.parser.host_control.degraded_hosts(crawl_started)
+        outage_ids = [product_id for product_id in stats['errors'] if hosts.get(product_id) in degraded]
+        await self.price_manager.record_crawl_failures(stats['errors'], outage_ids)
+        if flushed:
+            await self.price_manager.update_rollups(harvested_ids + stats['succeeded_ids'], cycle_started_at)
+        
+        CYCLE_SECONDS.observe(time.perf_counter() - started)
+        CYCLE_PRODUCTS.inc(len(harvested_ids), outcome='listing')
+        CYCLE_PRODUCTS.inc(stats['succeeded'], outcome='success')
+        CYCLE_PRODUCTS.inc(stats['failed'], outcome='failure')
+        logger.info("Задача мониторинга цен завершена")
+    
+    async def handle_metrics(self, request):
+        return web.Response(text=registry.render(), content_type='text/plain', charset='utf-8')
+
+    async def start_metrics_server(self):
+        app = web.Application()
+        app.router.add_get('/metrics', self.handle_metrics)
+        self.metrics_runner = web.AppRunner(app, access_log=None)
+        await self.metrics_runner.setup()
+        await web.TCPSite(self.metrics_runner, '0.0.0.0', settings.METRICS_PORT).start()
+        logger.info(f"Метрики доступны на порту {settings.METRICS_PORT}")
+
+    async def prune_archive(self):
+        try:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self.parser.archive.apply_retention)
+        except Exception as e:
+            logger.error(f"Ошибка очистки архива страниц: {str(e)}")
     
+    def start(self):
+        self.price_buffer.start()
+        if self.enrichment_worker:
+            self.enrichment_worker.start()
+        
         self.scheduler.add_job(
             self.monitor_prices,
             'interval',
-            minutes=60,
-            id='price_monitoring'
+            seconds=settings.SCHEDULER_TICK_SECONDS,
+            id='price_monitoring',
+            next_run_time=datetime.now(),
+            max_instances=1,
+            coalesce=True
         )
+        if self.parser.archive:
+            self.scheduler.add_job(
+                self.prune_archive,
+                'interval',
+                hours=24,
+                id='page_archive_retention'
+            )
+        if settings.DEAD_JOB_REPROBE_HOURS:
+            self.scheduler.add_job(
+                self.price_manager.requeue_crawl_jobs,
+                'interval',
+                hours=settings.DEAD_JOB_REPROBE_HOURS,
+                id='dead_crawl_jobs_reprobe'
+            )
+        self.scheduler.add_job(
+            self.price_manager.maintain_price_history,
+            'interval',
+            hours=24,
+            id='price_history_partitions'
+        )
+        
         self.scheduler.start()
-        logger.info("Сервис мониторинга цен запущен (интервал: 60 минут)")
+        
+        if settings.SCHEDULER_MODE == "adaptive":
+            logger.info(
+                f"Сервис мониторинга цен {self.worker_id} запущен (адаптивный режим: "
+                f"от {settings.CHECK_INTERVAL_MIN} до {settings.CHECK_INTERVAL_MAX} с)"
+            )
+        else:
+            logger.info(
+                f"Сервис мониторинга цен {self.worker_id} запущен "
+                f"(интервал: {settings.FIXED_CHECK_INTERVAL // 60} минут)"
+            )
     
     async def stop(self):
         self.scheduler.shutdown()
+        if self.enrichment_worker:
+            await self.enrichment_worker.stop()
+        if self.price_buffer:
+            await self.price_buffer.stop()
+        if self.price_manager:
+            await self.price_manager.release_leases(self.worker_id)
         if self.parser:
             await self.parser.close()
+        if self.metrics_runner:
+            await self.metrics_runner.cleanup()
         logger.info("Сервис мониторинга цен остановлен")
 
 async def main():
+    started = time.perf_counter()
     service = MonitoringService()
     
     if not await service.initialize():
         return
     
     service.start()
+    logger.info(f"Холодный старт сервиса мониторинга: {time.perf_counter() - started:.2f} с")
     
-    try:
-        while True:
-            await asyncio.sleep(1)
-    except KeyboardInterrupt:
-        await service.stop()
+    stop_requested = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signum, stop_requested.set)
+    
+    await stop_requested.wait()
+    logger.info("Получен сигнал остановки")
+    await service.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
@@ -0,0 +1,151 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from logger_config import setup_logger
+
+logger = setup_logger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+def escape_label(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names: tuple, values: tuple, extra: str = '') -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name: str, description: str, labels: tuple = ()):
+        self.name = name
+        self.description = description
+        self.labels = tuple(labels)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, '')) for name in self.labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(self.labels, key)} {value}")
+        return lines
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self.lock:
+            self.values[self.key(labels)] = value
+
+    def clear(self):
+        with self.lock:
+            self.values = {}
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, description: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        super().__init__(name, description, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self.key(labels)
+        with self.lock:
+            series = self.values.get(key)
+            if series is None:
+                series = self.values[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+            series['counts'][bisect_left(self.buckets, value)] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            for key, series in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float('inf'),), series['counts']):
+                    cumulative += count
+                    le = 'le="+Inf"' if bound == float('inf') else f'le="{bound}"'
+                    lines.append(f"{self.name}_bucket{format_labels(self.labels, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{format_labels(self.labels, key)} {series['sum']}")
+                lines.append(f"{self.name}_count{format_labels(self.labels, key)} {series['count']}")
+        return lines
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self.lock = threading.Lock()
+
+    def register(self, metric: Metric) -> Metric:
+        with self.lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name: str, description: str, labels: tuple = ()) -> Counter:
+        return self.register(Counter(name, description, labels))
+
+    def gauge(self, name: str, description: str, labels: tuple = ()) -> Gauge:
+        return self.register(Gauge(name, description, labels))
+
+    def histogram(self, name: str, description: str, labels: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, description, labels, buckets))
+
+    def add_collector(self, collector):
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                logger.error(f"Ошибка сбора метрик: {e}")
+
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+registry = MetricsRegistry()
+
+FETCH_SECONDS = registry.histogram('fetch_seconds', 'Длительность HTTP-запроса страницы', ('host',))
+FETCH_REQUESTS = registry.counter('fetch_requests_total', 'HTTP-запросы страниц по результату', ('host', 'outcome'))
+FETCH_RETRIES = registry.counter('fetch_retries_total', 'Повторные попытки загрузки страниц', ('host',))
+PARSE_SECONDS = registry.histogram('parse_seconds', 'Длительность разбора страницы', ('kind',))
+DB_WRITE_SECONDS = registry.histogram('db_write_seconds', 'Длительность записи в базу данных', ('operation',))
+CYCLE_SECONDS = registry.histogram(
+    'monitor_cycle_seconds',
+    'Длительность цикла мониторинга',
+    buckets=(1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0, 1800.0, 3600.0)
+)
+CYCLE_PRODUCTS = registry.counter('monitor_products_total', 'Товары, обработанные мониторингом', ('outcome',))
+PRICE_BUFFER_SIZE = registry.gauge('price_buffer_records', 'Записи в буфере цен, ожидающие выгрузки')
+PRICE_BUFFER_DROPPED = registry.counter('price_buffer_dropped_total', 'Записи, отброшенные при переполнении буфера цен')
+DB_POOL = registry.gauge('db_pool_connections', 'Соединения пула базы данных', ('state',))
+HTTP_POOL = registry.gauge('http_pool_connections', 'Соединения пула HTTP', ('state',))
+HOST_LIMIT = registry.gauge('host_concurrency_limit', 'Текущий лимит параллельных запросов к хосту', ('host',))
+HOST_IN_FLIGHT = registry.gauge('host_in_flight', 'Выполняющиеся запросы к хосту', ('host',))
+HOST_CIRCUIT_OPEN = registry.gauge('host_circuit_open', 'Предохранитель хоста разомкнут (1) или полуоткрыт (0.5)', ('host',))
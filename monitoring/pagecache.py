@@ -0,0 +1,72 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Optional
+
+from logger_config import setup_logger
+from config import settings
+
+logger = setup_logger(__name__)
+
+class ValidatorCache:
+    def __init__(self, path: str = None, flush_every: int = None):
+        self.path = Path(path or settings.PARSER_CACHE_PATH)
+        self.flush_every = flush_every or settings.PARSER_CACHE_FLUSH_EVERY
+        self.entries = {}
+        self.pending = 0
+        self.load()
+
+    @staticmethod
+    def body_hash(body: bytes) -> str:
+        return hashlib.sha256(body).hexdigest()
+
+    def load(self):
+        if not self.path.exists():
+            return
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                self.entries = json.load(f)
+            logger.info(f"Кэш валидаторов загружен: {len(self.entries)} записей")
+        except Exception as e:
+            logger.warning(f"Не удалось загрузить кэш валидаторов {self.path}: {e}")
+            self.entries = {}
+
+    def get(self, link: str) -> Optional[dict]:
+        return self.entries.get(link)
+
+    def conditional_headers(self, link: str) -> dict:
+        entry = self.entries.get(link)
+        if not entry:
+            return {}
+
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, link: str, etag: Optional[str], last_modified: Optional[str], body_hash: Optional[str], result: dict):
+        self.entries[link] = {
+            'etag': etag,
+            'last_modified': last_modified,
+            'body_hash': body_hash,
+            'result': result
+        }
+        self.pending += 1
+        if self.pending >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.entries, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+            self.pending = 0
+        except Exception as e:
+            logger.error(f"Ошибка сохранения кэша валидаторов {self.path}: {e}")
@@ -0,0 +1,81 @@
+import asyncio
+import time
+from datetime import datetime
+
+from logger_config import setup_logger
+from config import settings
+from metrics import PRICE_BUFFER_DROPPED, PRICE_BUFFER_SIZE
+
+logger = setup_logger(__name__)
+
+class PriceHistoryBuffer:
+    def __init__(self, price_manager, max_size: int = None, flush_interval: int = None):
+        self.price_manager = price_manager
+        self.max_size = max_size or settings.PRICE_BATCH_SIZE
+        self.flush_interval = flush_interval or settings.PRICE_FLUSH_INTERVAL
+        self.max_records = max(settings.PRICE_BUFFER_MAX_RECORDS, self.max_size)
+        self.records = []
+        self.lock = asyncio.Lock()
+        self.flusher = None
+        self.failures = 0
+        self.retry_at = 0.0
+
+    def trim(self):
+        overflow = len(self.records) - self.max_records
+        if overflow > 0:
+            del self.records[:overflow]
+            PRICE_BUFFER_DROPPED.inc(overflow)
+            logger.warning(f"Буфер цен переполнен, отброшено {overflow} самых старых записей")
+        PRICE_BUFFER_SIZE.set(len(self.records))
+
+    async def add(self, product_id: int, price: float):
+        self.records.append((product_id, price, datetime.utcnow()))
+        self.trim()
+        if len(self.records) >= self.max_size and not self.lock.locked() and time.monotonic() >= self.retry_at:
+            await self.flush()
+
+    async def flush(self, force: bool = False) -> bool:
+        if not force and time.monotonic() < self.retry_at:
+            return False
+
+        async with self.lock:
+            if not self.records:
+                return True
+
+            records, self.records = self.records, []
+            result = await self.price_manager.add_price_history_batch(records)
+
+            if result.error:
+                self.failures += 1
+                delay = min(self.flush_interval * 2 ** (self.failures - 1), settings.PRICE_FLUSH_BACKOFF_MAX)
+                self.retry_at = time.monotonic() + delay
+                logger.error(
+                    f"Не удалось сохранить {len(records)} цен, повтор выгрузки через {delay} с: {result.message}"
+                )
+                self.records = records + self.records
+                self.trim()
+                return False
+
+            self.failures = 0
+            self.retry_at = 0.0
+            PRICE_BUFFER_SIZE.set(len(self.records))
+            logger.info(f"Выгружено {result.payload['inserted']} цен из буфера")
+            return True
+
+    async def run_periodic_flush(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Ошибка периодической выгрузки буфера цен: {str(e)}")
+
+    def start(self):
+        if not self.flusher:
+            self.flusher = asyncio.create_task(self.run_periodic_flush())
+
+    async def stop(self):
+        if self.flusher:
+            self.flusher.cancel()
+            self.flusher = None
+        await self.flush(force=True)
@@ -1,9 +1,21 @@
-from sqlalchemy import select
-from typing import List, Optional
-from models import Product, PriceHistory
+from sqlalchemy import select, insert, update, delete, bindparam, func, or_, and_, case, text, tuple_
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from typing import List, Optional, Sequence, Dict
+from datetime import datetime, timedelta, timezone
+import base64
+import json
+import random
+import time
+from types import SimpleNamespace
+from urllib.parse import urlparse
+from models import Product, PriceHistory, CrawlJob, ImportJob, DeleteJob, LatestPrice, PriceRollup
 from database import db_manager
-from schemas import ProductResponse, PriceHistoryResponse
-from config import DefaultResponse
+from schemas import ProductResponse, ProductWithPricesResponse, PriceHistoryResponse, CrawlJobResponse, ImportJobResponse, DeleteJobResponse, LatestPriceResponse, PageResponse, PriceRollupResponse
+from config import DefaultResponse, settings
+from links import normalize_link
+from migrations import LATEST_PRICE_REFRESH, ROLLUP_BUCKETS, ROLLUP_TOUCHED_RECENT, rollup_statements
+from partitions import ensure_partitions, ensure_future_partitions, apply_retention, try_maintenance_lock, release_maintenance_lock
+from metrics import DB_WRITE_SECONDS, FETCH_RETRIES
 from logger_config import setup_logger
 
 logger = setup_logger(__name__)
@@ -12,11 +24,33 @@ class PriceManager:
     def __init__(self, parser=None):
         self.parser = parser
 
+    async def fetch_product_info(self, link: str) -> dict:
+        if not self.parser:
+            return {}
+        
+        try:
+            full_info = await self.parser.get_product_full_info(link)
+            product_info = {
+                'name': full_info.get('name'),
+                'description': full_info.get('description'),
+                'rating': full_info.get('rating'),
+                'price': full_info.get('price'),
+                'listing_url': normalize_link(full_info.get('category_url'), base=link)
+            }
+            logger.info(f"Получена информация о товаре: {product_info}")
+            return product_info
+        except Exception as e:
+            logger.warning(f"Ошибка при получении информации о товаре: {str(e)}")
+            return {}
+
     async def add_product(self, link: str, name: str = None) -> DefaultResponse:
         try:
+            normalized_link = normalize_link(link)
             async with db_manager.get_session() as session:
                 existing_product = await session.execute(
-                    select(Product).where(Product.link == link)
+                    select(Product.id)
+                    .where(Product.normalized_link == normalized_link if normalized_link else Product.link == link)
+                    .limit(1)
                 )
                 if existing_product.scalar_one_or_none():
                     logger.warning(f"Попытка добавить товар с уже существующей ссылкой: {link}")
@@ -25,33 +59,31 @@ class PriceManager:
                         message="Товар с такой ссылкой уже существует",
                         payload=None
                     )
-                
-                product_info = {}
-                if self.parser:
-                    try:
-                        full_info = await self.parser.get_product_full_info(link)
-                        product_info = {
-                            'name': full_info.get('name'),
-                            'description': full_info.get('description'),
-                            'rating': full_info.get('rating')
-                        }
-                        logger.info(f"Получена информация о товаре: {product_info}")
-                    except Exception as e:
-                        logger.warning(f"Ошибка при получении информации о товаре: {str(e)}")
-                        product_info = {}
-                
+            
+            background = settings.ENRICHMENT_MODE == "background"
+            product_info = {} if background else await self.fetch_product_info(link)
+            
+            async with db_manager.get_session() as session:
+                now = datetime.utcnow()
                 product = Product(
                     link=link,
+                    normalized_link=normalized_link,
                     name=name or product_info.get('name'),
                     description=product_info.get('description'), 
-                    rating=product_info.get('rating')
+                    rating=product_info.get('rating'),
+                    listing_url=product_info.get('listing_url'),
+                    enrichment_status='pending' if background else 'done',
+                    enrichment_updated_at=now
                 )
                 
                 session.add(product)
                 await session.commit()
                 await session.refresh(product)
                 
-                logger.info(f"СОХРАНЕНО В БД: ID={product.id}, name='{product.name}', desc='{product.description}', rating={product.rating}")
+                logger.info(
+                    f"СОХРАНЕНО В БД: ID={product.id}, name='{product.name}', desc='{product.description}', "
+                    f"rating={product.rating}, enrichment={product.enrichment_status}"
+                )
                 
                 product_response = ProductResponse.model_validate(product)
                 
@@ -69,22 +101,244 @@ class PriceManager:
                 payload=None
             )
 
-    async def delete_product(self, product_id: int) -> DefaultResponse:
+    async def claim_enrichment_batch(self, limit: int) -> DefaultResponse:
+        try:
+            now = datetime.utcnow()
+            stale = now - timedelta(seconds=settings.LEASE_TTL_SECONDS)
+            
+            async with db_manager.get_session() as session:
+                pending_ids = (
+                    select(Product.id)
+                    .where(
+                        or_(
+                            Product.enrichment_status == 'pending',
+                            and_(Product.enrichment_status == 'running', Product.enrichment_updated_at < stale)
+                        )
+                    )
+                    .order_by(Product.id)
+                    .limit(limit)
+                    .with_for_update(skip_locked=True)
+                    .scalar_subquery()
+                )
+                result = await session.execute(
+                    update(Product)
+                    .where(Product.id.in_(pending_ids))
+                    .values(enrichment_status='running', enrichment_updated_at=now)
+                    .returning(Product)
+                    .execution_options(synchronize_session=False)
+                )
+                products = result.scalars().all()
+                await session.commit()
+                
+                products_response = [ProductResponse.model_validate(product) for product in products]
+                
+                return DefaultResponse(
+                    error=False,
+                    message="Товары для обогащения получены",
+                    payload=products_response
+                )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при получении товаров для обогащения: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при получении товаров для обогащения: {str(e)}",
+                payload=None
+            )
+
+    async def finish_enrichment(self, product_id: int, product_info: dict) -> DefaultResponse:
         try:
+            now = datetime.utcnow()
+            succeeded = any(product_info.values())
+            
             async with db_manager.get_session() as session:
                 product = await session.get(Product, product_id)
-                if product:
+                if not product:
+                    return DefaultResponse(error=True, message="Товар не найден", payload=None)
+                
+                product.name = product.name or product_info.get('name')
+                product.description = product_info.get('description') or product.description
+                product.rating = product_info.get('rating') or product.rating
+                product.listing_url = product_info.get('listing_url') or product.listing_url
+                product.enrichment_status = 'done' if succeeded else 'failed'
+                product.enrichment_updated_at = now
+                
+                price = product_info.get('price')
+                if price is not None:
+                    await session.flush()
+                    await self.store_price_chunk(session, [(product_id, price, now)])
+                    interval = self.compute_check_interval(0)
+                    product.next_check_at = now + timedelta(seconds=interval)
+                    product.check_interval = interval
+                
+                await session.commit()
+                
+                if price is not None:
+                    await self.update_rollups([product_id], now)
+                
+                logger.info(f"Обогащение товара ID {product_id} завершено: {product.enrichment_status}, цена {price}")
+                return DefaultResponse(
+                    error=False,
+                    message="Обогащение товара завершено",
+                    payload={"status": product.enrichment_status, "price": price}
+                )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при сохранении данных обогащения товара: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при сохранении данных обогащения товара: {str(e)}",
+                payload=None
+            )
+
+    async def create_import_job(self, bytes_total: int) -> DefaultResponse:
+        try:
+            async with db_manager.get_session() as session:
+                job = ImportJob(status='running', bytes_total=bytes_total)
+                session.add(job)
+                await session.commit()
+                await session.refresh(job)
+                
+                logger.info(f"Создано задание импорта ID {job.id} ({bytes_total} байт)")
+                return DefaultResponse(
+                    error=False,
+                    message="Задание импорта создано",
+                    payload=ImportJobResponse.model_validate(job)
+                )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при создании задания импорта: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при создании задания импорта: {str(e)}",
+                payload=None
+            )
+
+    async def import_products_batch(self, job_id: int, rows: Sequence, bytes_processed: int) -> DefaultResponse:
+        try:
+            candidates = {}
+            invalid = 0
+            for link, name in rows:
+                normalized_link = normalize_link(link)
+                if not normalized_link:
+                    invalid += 1
+                    continue
+                candidates.setdefault(normalized_link, (link.strip(), name or None))
+            
+            now = datetime.utcnow()
+            enrichment_status = 'pending' if settings.ENRICHMENT_MODE == "background" else 'done'
+            
+            started = time.perf_counter()
+            async with db_manager.get_session() as session:
+                inserted = 0
+                if candidates:
                     result = await session.execute(
-                        select(PriceHistory).where(PriceHistory.product_id == product_id)
+                        select(Product.normalized_link).where(Product.normalized_link.in_(candidates.keys()))
                     )
-                    price_history_records = result.scalars().all()
+                    existing = set(result.scalars().all())
                     
-                    for record in price_history_records:
-                        await session.delete(record)
+                    new_rows = [
+                        {
+                            'link': link,
+                            'normalized_link': normalized_link,
+                            'name': name,
+                            'enrichment_status': enrichment_status,
+                            'enrichment_updated_at': now
+                        }
+                        for normalized_link, (link, name) in candidates.items()
+                        if normalized_link not in existing
+                    ]
+                    if new_rows:
+                        result = await session.execute(
+                            pg_insert(Product)
+                            .values(new_rows)
+                            .on_conflict_do_nothing(index_elements=[Product.normalized_link])
+                            .returning(Product.id)
+                        )
+                        inserted = len(result.all())
+                
+                await session.execute(
+                    update(ImportJob)
+                    .where(ImportJob.id == job_id)
+                    .values(
+                        rows_processed=ImportJob.rows_processed + len(rows),
+                        inserted=ImportJob.inserted + inserted,
+                        duplicates=ImportJob.duplicates + len(rows) - invalid - inserted,
+                        invalid=ImportJob.invalid + invalid,
+                        bytes_processed=bytes_processed,
+                        updated_at=now
+                    )
+                )
+                await session.commit()
+                DB_WRITE_SECONDS.observe(time.perf_counter() - started, operation='import_products')
+            
+            logger.info(f"Импорт {job_id}: обработано {len(rows)} строк, добавлено {inserted}, некорректных {invalid}")
+            return DefaultResponse(
+                error=False,
+                message="Пакет импорта обработан",
+                payload={"inserted": inserted, "invalid": invalid}
+            )
                     
-                    await session.delete(product)
-                    await session.commit()
+        except Exception as e:
+            logger.error(f"Ошибка при импорте пакета товаров: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при импорте пакета товаров: {str(e)}",
+                payload=None
+            )
+
+    async def finish_import_job(self, job_id: int, error: Optional[str] = None) -> DefaultResponse:
+        try:
+            async with db_manager.get_session() as session:
+                await session.execute(
+                    update(ImportJob)
+                    .where(ImportJob.id == job_id)
+                    .values(status='failed' if error else 'done', error=error, updated_at=datetime.utcnow())
+                )
+                await session.commit()
+            
+            logger.info(f"Задание импорта ID {job_id} завершено{': ' + error if error else ''}")
+            return DefaultResponse(error=False, message="Задание импорта завершено", payload=None)
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при завершении задания импорта: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при завершении задания импорта: {str(e)}",
+                payload=None
+            )
+
+    async def get_import_job(self, job_id: int) -> DefaultResponse:
+        try:
+            async with db_manager.get_session() as session:
+                job = await session.get(ImportJob, job_id)
+                if not job:
+                    return DefaultResponse(error=True, message="Задание импорта не найдено", payload=None)
+                
+                return DefaultResponse(
+                    error=False,
+                    message="Задание импорта получено",
+                    payload=ImportJobResponse.model_validate(job)
+                )
                     
+        except Exception as e:
+            logger.error(f"Ошибка при получении задания импорта: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при получении задания импорта: {str(e)}",
+                payload=None
+            )
+
+    async def delete_product(self, product_id: int) -> DefaultResponse:
+        try:
+            async with db_manager.get_session() as session:
+                result = await session.execute(
+                    delete(Product).where(Product.id == product_id).returning(Product.id)
+                )
+                deleted = result.scalar()
+                await session.commit()
+                
+                if deleted:
                     logger.info(f"Товар успешно удален: ID {product_id}")
                     return DefaultResponse(
                         error=False,
@@ -107,6 +361,133 @@ class PriceManager:
                 payload=None
             )
 
+    async def has_large_history(self, product_ids: Sequence[int], threshold: int) -> bool:
+        async with db_manager.get_session() as session:
+            result = await session.execute(
+                select(PriceHistory.id)
+                .where(PriceHistory.product_id.in_(product_ids))
+                .offset(threshold)
+                .limit(1)
+            )
+            return result.first() is not None
+
+    async def delete_products(self, product_ids: Sequence[int], job_id: Optional[int] = None, start: int = 0) -> DefaultResponse:
+        try:
+            product_ids = list(dict.fromkeys(product_ids))
+            deleted = 0
+            
+            started = time.perf_counter()
+            for offset in range(start, len(product_ids), settings.DELETE_BATCH_SIZE):
+                chunk = product_ids[offset:offset + settings.DELETE_BATCH_SIZE]
+                async with db_manager.get_session() as session:
+                    result = await session.execute(
+                        delete(Product).where(Product.id.in_(chunk)).returning(Product.id)
+                    )
+                    removed = len(result.scalars().all())
+                    deleted += removed
+                    if job_id:
+                        await session.execute(
+                            update(DeleteJob)
+                            .where(DeleteJob.id == job_id)
+                            .values(
+                                processed=offset + len(chunk),
+                                deleted=DeleteJob.deleted + removed,
+                                updated_at=datetime.utcnow()
+                            )
+                        )
+                    await session.commit()
+            DB_WRITE_SECONDS.observe(time.perf_counter() - started, operation='delete_products')
+            
+            logger.info(f"Удалено товаров: {deleted} из {len(product_ids) - start}")
+            return DefaultResponse(
+                error=False,
+                message="Товары успешно удалены",
+                payload={"deleted": deleted, "missing": len(product_ids) - start - deleted}
+            )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при удалении товаров: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при удалении товаров: {str(e)}",
+                payload=None
+            )
+
+    async def create_delete_job(self, product_ids: Sequence[int]) -> DefaultResponse:
+        try:
+            product_ids = list(dict.fromkeys(product_ids))
+            async with db_manager.get_session() as session:
+                job = DeleteJob(status='running', product_ids=product_ids, total=len(product_ids))
+                session.add(job)
+                await session.commit()
+                await session.refresh(job)
+                
+                logger.info(f"Создано задание удаления ID {job.id} ({len(product_ids)} товаров)")
+                return DefaultResponse(
+                    error=False,
+                    message="Задание удаления создано",
+                    payload=DeleteJobResponse.model_validate(job)
+                )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при создании задания удаления: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при создании задания удаления: {str(e)}",
+                payload=None
+            )
+
+    async def get_unfinished_delete_jobs(self) -> list:
+        async with db_manager.get_session() as session:
+            result = await session.execute(
+                select(DeleteJob.id, DeleteJob.product_ids, DeleteJob.processed)
+                .where(DeleteJob.status == 'running')
+                .order_by(DeleteJob.id)
+            )
+            return result.all()
+
+    async def finish_delete_job(self, job_id: int, error: Optional[str] = None) -> DefaultResponse:
+        try:
+            async with db_manager.get_session() as session:
+                await session.execute(
+                    update(DeleteJob)
+                    .where(DeleteJob.id == job_id)
+                    .values(status='failed' if error else 'done', error=error, updated_at=datetime.utcnow())
+                )
+                await session.commit()
+            
+            logger.info(f"Задание удаления ID {job_id} завершено{': ' + error if error else ''}")
+            return DefaultResponse(error=False, message="Задание удаления завершено", payload=None)
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при завершении задания удаления: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при завершении задания удаления: {str(e)}",
+                payload=None
+            )
+
+    async def get_delete_job(self, job_id: int) -> DefaultResponse:
+        try:
+            async with db_manager.get_session() as session:
+                job = await session.get(DeleteJob, job_id)
+                if not job:
+                    return DefaultResponse(error=True, message="Задание удаления не найдено", payload=None)
+                
+                return DefaultResponse(
+                    error=False,
+                    message="Задание удаления получено",
+                    payload=DeleteJobResponse.model_validate(job)
+                )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при получении задания удаления: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при получении задания удаления: {str(e)}",
+                payload=None
+            )
+
     async def get_all_products(self) -> DefaultResponse:
         try:
             async with db_manager.get_session() as session:
@@ -130,58 +511,1124 @@ class PriceManager:
                 payload=None
             )
 
-    async def add_price_history(self, product_id: int, price: float) -> DefaultResponse:
+    async def get_product(self, product_id: int) -> DefaultResponse:
         try:
             async with db_manager.get_session() as session:
                 product = await session.get(Product, product_id)
                 if not product:
-                    logger.warning(f"Попытка добавить цену для несуществующего товара: ID {product_id}")
                     return DefaultResponse(
                         error=True,
                         message="Товар не найден",
                         payload=None
                     )
                 
-                price_history = PriceHistory(product_id=product_id, price=price)
-                session.add(price_history)
-                await session.commit()
-                await session.refresh(price_history)
+                return DefaultResponse(
+                    error=False,
+                    message="Товар успешно получен",
+                    payload=ProductResponse.model_validate(product)
+                )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при получении товара: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при получении товара: {str(e)}",
+                payload=None
+            )
+
+    def encode_cursor(self, *values) -> str:
+        raw = json.dumps([value.isoformat() if isinstance(value, datetime) else value for value in values])
+        return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor: str) -> list:
+        try:
+            return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+        except Exception:
+            raise ValueError("Некорректный курсор")
+
+    def to_naive_utc(self, value: Optional[datetime]) -> Optional[datetime]:
+        if value is None or value.tzinfo is None:
+            return value
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+    def page_limit(self, limit: Optional[int]) -> int:
+        return max(1, min(limit or settings.PAGE_SIZE_DEFAULT, settings.PAGE_SIZE_MAX))
+
+    async def get_products_page(self, limit: Optional[int] = None, cursor: Optional[str] = None) -> DefaultResponse:
+        try:
+            limit = self.page_limit(limit)
+            query = select(Product).order_by(Product.id).limit(limit + 1)
+            if cursor:
+                last_id, = self.decode_cursor(cursor)
+                query = query.where(Product.id > int(last_id))
+            
+            async with db_manager.get_session() as session:
+                result = await session.execute(query)
+                products = result.scalars().all()
                 
-                price_history_response = PriceHistoryResponse.model_validate(price_history)
+                next_cursor = self.encode_cursor(products[limit - 1].id) if len(products) > limit else None
+                page = PageResponse[ProductResponse](
+                    items=[ProductResponse.model_validate(product) for product in products[:limit]],
+                    next_cursor=next_cursor
+                )
                 
-                logger.info(f"Цена {price} успешно добавлена для товара ID {product_id}")
+                logger.info(f"Получена страница из {len(page.items)} товаров")
                 return DefaultResponse(
                     error=False,
-                    message="Цена успешно добавлена",
-                    payload=price_history_response
+                    message="Список товаров успешно получен",
+                    payload=page
                 )
                     
         except Exception as e:
-            logger.error(f"Ошибка при добавлении истории цены: {str(e)}")
+            logger.error(f"Ошибка при получении страницы товаров: {str(e)}")
             return DefaultResponse(
                 error=True,
-                message=f"Ошибка при добавлении истории цены: {str(e)}",
+                message=f"Ошибка при получении страницы товаров: {str(e)}",
                 payload=None
             )
 
-    async def get_current_price(self, product_id: int) -> Optional[float]:
+    async def get_products_with_prices(self) -> DefaultResponse:
         try:
             async with db_manager.get_session() as session:
                 result = await session.execute(
-                    select(PriceHistory)
-                    .where(PriceHistory.product_id == product_id)
-                    .order_by(PriceHistory.created_at.desc())
-                    .limit(1)
+                    select(Product, LatestPrice.price, LatestPrice.changed_at, LatestPrice.change_pct)
+                    .outerjoin(LatestPrice, LatestPrice.product_id == Product.id)
+                    .order_by(Product.id)
                 )
-                latest_price = result.scalar_one_or_none()
                 
-                return latest_price.price if latest_price else None
+                products_response = [
+                    ProductWithPricesResponse(
+                        **ProductResponse.model_validate(row.Product).model_dump(),
+                        current_price=row.price,
+                        price_changed_at=row.changed_at,
+                        change_pct=row.change_pct
+                    )
+                    for row in result
+                ]
                 
+                logger.info(f"Получено {len(products_response)} товаров с текущими ценами")
+                return DefaultResponse(
+                    error=False,
+                    message="Список товаров с ценами успешно получен",
+                    payload=products_response
+                )
+                    
         except Exception as e:
-            logger.error(f"Ошибка при получении текущей цены: {str(e)}")
-            return None
+            logger.error(f"Ошибка при получении списка товаров с ценами: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при получении списка товаров с ценами: {str(e)}",
+                payload=None
+            )
+
+    async def claim_due_products(self, limit: int, worker_id: str) -> DefaultResponse:
+        try:
+            now = datetime.utcnow()
+            
+            async with db_manager.get_session() as session:
+                due_ids = (
+                    select(Product.id)
+                    .where(
+                        or_(Product.next_check_at.is_(None), Product.next_check_at <= now),
+                        or_(Product.lease_expires_at.is_(None), Product.lease_expires_at < now),
+                        Product.enrichment_status.notin_(('pending', 'running')),
+                        ~select(CrawlJob.id)
+                        .where(CrawlJob.product_id == Product.id, CrawlJob.status == 'dead')
+                        .exists()
+                    )
+                    .order_by(Product.next_check_at.asc().nulls_first())
+                    .limit(limit)
+                    .with_for_update(skip_locked=True)
+                    .scalar_subquery()
+                )
+                result = await session.execute(
+                    update(Product)
+                    .where(Product.id.in_(due_ids))
+                    .values(
+                        lease_owner=worker_id,
+                        lease_expires_at=now + timedelta(seconds=settings.LEASE_TTL_SECONDS)
+                    )
+                    .returning(Product)
+                    .execution_options(synchronize_session=False)
+                )
+                products = result.scalars().all()
+                await session.commit()
+                
+                products_response = [ProductResponse.model_validate(product) for product in products]
+                
+                logger.info(f"Воркер {worker_id} взял в аренду {len(products)} товаров")
+                return DefaultResponse(
+                    error=False,
+                    message="Товары к проверке успешно получены",
+                    payload=products_response
+                )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при получении товаров к проверке: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при получении товаров к проверке: {str(e)}",
+                payload=None
+            )
+
+    async def release_leases(self, worker_id: str) -> DefaultResponse:
+        try:
+            async with db_manager.get_session() as session:
+                result = await session.execute(
+                    update(Product)
+                    .where(Product.lease_owner == worker_id)
+                    .values(lease_owner=None, lease_expires_at=None)
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+                
+                logger.info(f"Воркер {worker_id} освободил {result.rowcount} товаров")
+                return DefaultResponse(
+                    error=False,
+                    message="Аренда товаров снята",
+                    payload={"released": result.rowcount}
+                )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при снятии аренды товаров: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при снятии аренды товаров: {str(e)}",
+                payload=None
+            )
+
+    async def renew_leases(self, worker_id: str) -> DefaultResponse:
+        try:
+            async with db_manager.get_session() as session:
+                result = await session.execute(
+                    update(Product)
+                    .where(Product.lease_owner == worker_id)
+                    .values(lease_expires_at=datetime.utcnow() + timedelta(seconds=settings.LEASE_TTL_SECONDS))
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+                
+                logger.debug(f"Воркер {worker_id} продлил аренду {result.rowcount} товаров")
+                return DefaultResponse(
+                    error=False,
+                    message="Аренда товаров продлена",
+                    payload={"renewed": result.rowcount}
+                )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при продлении аренды товаров: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при продлении аренды товаров: {str(e)}",
+                payload=None
+            )
+
+    def compute_check_interval(self, changes: int) -> int:
+        if settings.SCHEDULER_MODE == "fixed":
+            return settings.FIXED_CHECK_INTERVAL
+        
+        interval = settings.CHECK_INTERVAL_MAX // (changes + 1)
+        return max(settings.CHECK_INTERVAL_MIN, min(settings.CHECK_INTERVAL_MAX, interval))
+
+    async def reschedule_products(self, product_ids: Sequence[int]) -> DefaultResponse:
+        try:
+            if not product_ids:
+                return DefaultResponse(error=False, message="Нет товаров для планирования", payload={"rescheduled": 0})
+            
+            now = datetime.utcnow()
+            window_start = now - timedelta(days=settings.VOLATILITY_WINDOW_DAYS)
+            products_table = Product.__table__
+            
+            started = time.perf_counter()
+            async with db_manager.get_session() as session:
+                for start in range(0, len(product_ids), settings.PRICE_BATCH_SIZE):
+                    chunk = product_ids[start:start + settings.PRICE_BATCH_SIZE]
+                    
+                    observations = (
+                        select(
+                            PriceHistory.product_id,
+                            PriceHistory.price,
+                            func.lag(PriceHistory.price).over(
+                                partition_by=PriceHistory.product_id,
+                                order_by=PriceHistory.created_at
+                            ).label('previous_price')
+                        )
+                        .where(PriceHistory.product_id.in_(chunk), PriceHistory.created_at >= window_start)
+                        .subquery()
+                    )
+                    result = await session.execute(
+                        select(
+                            observations.c.product_id,
+                            func.count().filter(observations.c.price != observations.c.previous_price).label('changes')
+                        )
+                        .group_by(observations.c.product_id)
+                    )
+                    changes = {row.product_id: row.changes for row in result}
+                    
+                    params = []
+                    for product_id in chunk:
+                        interval = self.compute_check_interval(changes.get(product_id, 0))
+                        params.append({
+                            'product_id': product_id,
+                            'next_check': now + timedelta(seconds=interval),
+                            'interval': interval
+                        })
+                    
+                    await session.execute(
+                        update(products_table)
+                        .where(products_table.c.id == bindparam('product_id'))
+                        .values(
+                            next_check_at=bindparam('next_check'),
+                            check_interval=bindparam('interval'),
+                            lease_owner=None,
+                            lease_expires_at=None
+                        ),
+                        params
+                    )
+                    await session.execute(delete(CrawlJob).where(CrawlJob.product_id.in_(chunk)))
+                
+                await session.commit()
+                DB_WRITE_SECONDS.observe(time.perf_counter() - started, operation='reschedule')
+            
+            logger.info(f"Запланирована следующая проверка для {len(product_ids)} товаров")
+            return DefaultResponse(
+                error=False,
+                message="Проверки товаров запланированы",
+                payload={"rescheduled": len(product_ids)}
+            )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при планировании проверок товаров: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при планировании проверок товаров: {str(e)}",
+                payload=None
+            )
+
+    async def set_listing_urls(self, listing_urls: Dict[int, Optional[str]]) -> DefaultResponse:
+        if not listing_urls:
+            return DefaultResponse(error=False, message="Нет ссылок на каталог для обновления", payload={"updated": 0})
+        
+        try:
+            products_table = Product.__table__
+            async with db_manager.get_session() as session:
+                await session.execute(
+                    update(products_table)
+                    .where(products_table.c.id == bindparam('product_id'))
+                    .values(listing_url=bindparam('url')),
+                    [{'product_id': product_id, 'url': url} for product_id, url in listing_urls.items()]
+                )
+                await session.commit()
+            
+            logger.info(f"Обновлены ссылки на страницы каталога для {len(listing_urls)} товаров")
+            return DefaultResponse(
+                error=False,
+                message="Ссылки на каталог обновлены",
+                payload={"updated": len(listing_urls)}
+            )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении ссылок на каталог: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при обновлении ссылок на каталог: {str(e)}",
+                payload=None
+            )
+
+    def compute_retry_delay(self, attempts: int) -> float:
+        delay = min(settings.RETRY_MAX_DELAY, settings.RETRY_BASE_DELAY * 2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def record_crawl_failures(self, errors: Dict[int, str], outage_ids: Sequence[int] = ()) -> DefaultResponse:
+        try:
+            if not errors:
+                return DefaultResponse(error=False, message="Нет неудачных проверок", payload={"retry": 0, "dead": 0, "deferred": 0})
+            
+            now = datetime.utcnow()
+            retry = 0
+            dead = 0
+            deferred = 0
+            outage_ids = set(outage_ids)
+            jobs_table = CrawlJob.__table__
+            products_table = Product.__table__
+            
+            started = time.perf_counter()
+            async with db_manager.get_session() as session:
+                result = await session.execute(
+                    select(CrawlJob.product_id, CrawlJob.attempts).where(CrawlJob.product_id.in_(errors.keys()))
+                )
+                previous_attempts = {row.product_id: row.attempts for row in result}
+                
+                result = await session.execute(select(Product.id, Product.link).where(Product.id.in_(errors.keys())))
+                links = {row.id: row.link for row in result}
+                
+                jobs = []
+                schedule = []
+                retry_hosts = []
+                for product_id, error in errors.items():
+                    if product_id not in links:
+                        continue
+                    
+                    attempts = previous_attempts.get(product_id, 0) + 1
+                    if product_id in outage_ids:
+                        attempts -= 1
+                        status = 'retry'
+                        next_run_at = now + timedelta(seconds=self.compute_retry_delay(max(attempts, 1)))
+                        deferred += 1
+                    elif attempts >= settings.CRAWL_MAX_ATTEMPTS:
+                        status = 'dead'
+                        next_run_at = None
+                        dead += 1
+                    else:
+                        status = 'retry'
+                        next_run_at = now + timedelta(seconds=self.compute_retry_delay(attempts))
+                        retry += 1
+                    
+                    if status == 'retry':
+                        retry_hosts.append(urlparse(links[product_id]).netloc)
+                    
+                    jobs.append({
+                        'product_id': product_id,
+                        'status': status,
+                        'attempts': attempts,
+                        'next_run_at': next_run_at,
+                        'last_error': error,
+                        'created_at': now,
+                        'updated_at': now
+                    })
+                    schedule.append({'product_id': product_id, 'next_check': next_run_at})
+                
+                if jobs:
+                    statement = pg_insert(jobs_table).values(jobs)
+                    await session.execute(
+                        statement.on_conflict_do_update(
+                            index_elements=[jobs_table.c.product_id],
+                            set_={
+                                'status': statement.excluded.status,
+                                'attempts': statement.excluded.attempts,
+                                'next_run_at': statement.excluded.next_run_at,
+                                'last_error': statement.excluded.last_error,
+                                'updated_at': statement.excluded.updated_at
+                            }
+                        )
+                    )
+                    await session.execute(
+                        update(products_table)
+                        .where(products_table.c.id == bindparam('product_id'))
+                        .values(next_check_at=bindparam('next_check'), lease_owner=None, lease_expires_at=None),
+                        schedule
+                    )
+                
+                await session.commit()
+                DB_WRITE_SECONDS.observe(time.perf_counter() - started, operation='crawl_failures')
+            
+            for host in retry_hosts:
+                FETCH_RETRIES.inc(host=host)
+            
+            if dead:
+                logger.warning(f"{dead} товаров переведены в очередь недоставленных после {settings.CRAWL_MAX_ATTEMPTS} попыток")
+            if deferred:
+                logger.warning(f"{deferred} товаров отложены без учета попытки: хост недоступен целиком")
+            logger.info(f"Запланирован повтор проверки для {retry + deferred} товаров")
+            return DefaultResponse(
+                error=False,
+                message="Неудачные проверки запланированы повторно",
+                payload={"retry": retry, "dead": dead, "deferred": deferred}
+            )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при планировании повторных проверок: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при планировании повторных проверок: {str(e)}",
+                payload=None
+            )
+
+    async def get_crawl_jobs(self, status: Optional[str] = None) -> DefaultResponse:
+        try:
+            async with db_manager.get_session() as session:
+                query = select(CrawlJob).order_by(CrawlJob.updated_at.desc())
+                if status:
+                    query = query.where(CrawlJob.status == status)
+                
+                result = await session.execute(query)
+                jobs = result.scalars().all()
+                
+                jobs_response = [CrawlJobResponse.model_validate(job) for job in jobs]
+                
+                logger.info(f"Получено {len(jobs)} заданий обхода")
+                return DefaultResponse(
+                    error=False,
+                    message="Список заданий обхода успешно получен",
+                    payload=jobs_response
+                )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при получении заданий обхода: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при получении заданий обхода: {str(e)}",
+                payload=None
+            )
+
+    async def requeue_crawl_job(self, product_id: int) -> DefaultResponse:
+        try:
+            async with db_manager.get_session() as session:
+                result = await session.execute(delete(CrawlJob).where(CrawlJob.product_id == product_id))
+                if not result.rowcount:
+                    logger.warning(f"Попытка перезапустить несуществующее задание обхода: товар ID {product_id}")
+                    return DefaultResponse(
+                        error=True,
+                        message="Задание обхода не найдено",
+                        payload=None
+                    )
+                
+                await session.execute(
+                    update(Product)
+                    .where(Product.id == product_id)
+                    .values(next_check_at=None)
+                    .execution_options(synchronize_session=False)
+                )
+                await session.commit()
+                
+                logger.info(f"Задание обхода перезапущено: товар ID {product_id}")
+                return DefaultResponse(
+                    error=False,
+                    message="Задание обхода перезапущено",
+                    payload={"product_id": product_id}
+                )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при перезапуске задания обхода: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при перезапуске задания обхода: {str(e)}",
+                payload=None
+            )
+
+    async def requeue_crawl_jobs(self, status: str = 'dead', host: Optional[str] = None) -> DefaultResponse:
+        try:
+            async with db_manager.get_session() as session:
+                query = delete(CrawlJob).where(CrawlJob.status == status)
+                if host:
+                    query = query.where(
+                        CrawlJob.product_id.in_(
+                            select(Product.id).where(func.split_part(Product.link, '/', 3) == host)
+                        )
+                    )
+                result = await session.execute(query.returning(CrawlJob.product_id))
+                product_ids = result.scalars().all()
+                
+                for start in range(0, len(product_ids), settings.PRICE_BATCH_SIZE):
+                    await session.execute(
+                        update(Product)
+                        .where(Product.id.in_(product_ids[start:start + settings.PRICE_BATCH_SIZE]))
+                        .values(next_check_at=None)
+                        .execution_options(synchronize_session=False)
+                    )
+                await session.commit()
+                
+                logger.info(
+                    f"Перезапущено {len(product_ids)} заданий обхода со статусом {status}"
+                    f"{f', хост {host}' if host else ''}"
+                )
+                return DefaultResponse(
+                    error=False,
+                    message="Задания обхода перезапущены",
+                    payload={"requeued": len(product_ids)}
+                )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при массовом перезапуске заданий обхода: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при массовом перезапуске заданий обхода: {str(e)}",
+                payload=None
+            )
+
+    async def add_price_history(self, product_id: int, price: float) -> DefaultResponse:
+        try:
+            async with db_manager.get_session() as session:
+                product = await session.get(Product, product_id)
+                if not product:
+                    logger.warning(f"Попытка добавить цену для несуществующего товара: ID {product_id}")
+                    return DefaultResponse(
+                        error=True,
+                        message="Товар не найден",
+                        payload=None
+                    )
+                
+                now = datetime.utcnow()
+                price_history = None
+                
+                if settings.PRICE_STORAGE_MODE == "change_only":
+                    result = await session.execute(
+                        select(PriceHistory)
+                        .where(PriceHistory.product_id == product_id)
+                        .order_by(PriceHistory.created_at.desc())
+                        .limit(1)
+                    )
+                    latest = result.scalar_one_or_none()
+                    if latest and latest.price == price:
+                        latest.last_seen_at = now
+                        latest.observations += 1
+                        price_history = latest
+                
+                if price_history is None:
+                    price_history = PriceHistory(product_id=product_id, price=price, created_at=now, last_seen_at=now)
+                    session.add(price_history)
+                
+                await self.upsert_latest_prices(session, {product_id: [(now, price)]})
+                await session.commit()
+                await session.refresh(price_history)
+                
+                price_history_response = PriceHistoryResponse.model_validate(price_history)
+                
+                logger.info(f"Цена {price} успешно добавлена для товара ID {product_id}")
+                return DefaultResponse(
+                    error=False,
+                    message="Цена успешно добавлена",
+                    payload=price_history_response
+                )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при добавлении истории цены: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при добавлении истории цены: {str(e)}",
+                payload=None
+            )
+
+    async def get_latest_prices(self, session, product_ids) -> dict:
+        result = await session.execute(
+            select(PriceHistory.id, PriceHistory.product_id, PriceHistory.price, PriceHistory.created_at)
+            .where(PriceHistory.product_id.in_(product_ids))
+            .distinct(PriceHistory.product_id)
+            .order_by(PriceHistory.product_id, PriceHistory.created_at.desc())
+        )
+        return {row.product_id: (row.id, row.price, row.created_at) for row in result}
+
+    async def store_price_chunk(self, session, chunk: Sequence[tuple]) -> dict:
+        counts = {'inserted': 0, 'extended': 0, 'skipped': 0}
+        change_only = settings.PRICE_STORAGE_MODE == "change_only"
+        history_table = PriceHistory.__table__
+        
+        product_ids = {record[0] for record in chunk}
+        
+        result = await session.execute(
+            select(Product.id).where(Product.id.in_(product_ids))
+        )
+        existing_ids = set(result.scalars().all())
+        latest = await self.get_latest_prices(session, existing_ids) if change_only else {}
+        
+        rows = {}
+        extensions = {}
+        points = {}
+        for product_id, price, *observed_at in chunk:
+            if product_id not in existing_ids:
+                counts['skipped'] += 1
+                continue
+            
+            observed_at = observed_at[0] if observed_at else datetime.utcnow()
+            points.setdefault(product_id, []).append((observed_at, price))
+            pending = rows.get(product_id)
+            
+            if change_only and pending and pending[-1]['price'] == price:
+                pending[-1]['last_seen_at'] = observed_at
+                pending[-1]['observations'] += 1
+                continue
+            
+            if change_only and not pending and product_id in latest and latest[product_id][1] == price:
+                row_id, _, row_created = latest[product_id]
+                extension = extensions.setdefault(
+                    row_id,
+                    {'row_id': row_id, 'row_created': row_created, 'seen': observed_at, 'increment': 0}
+                )
+                extension['seen'] = observed_at
+                extension['increment'] += 1
+                continue
+            
+            rows.setdefault(product_id, []).append({
+                'product_id': product_id,
+                'price': price,
+                'created_at': observed_at,
+                'last_seen_at': observed_at,
+                'observations': 1
+            })
+        
+        if extensions:
+            await session.execute(
+                update(history_table)
+                .where(
+                    history_table.c.id == bindparam('row_id'),
+                    history_table.c.created_at == bindparam('row_created')
+                )
+                .values(
+                    last_seen_at=bindparam('seen'),
+                    observations=history_table.c.observations + bindparam('increment')
+                ),
+                list(extensions.values())
+            )
+            counts['extended'] += len(extensions)
+        
+        values = [row for product_rows in rows.values() for row in product_rows]
+        if values:
+            await session.execute(insert(PriceHistory).values(values))
+            counts['inserted'] += len(values)
+        
+        await self.upsert_latest_prices(session, points)
+        return counts
+
+    async def add_price_history_batch(self, records: Sequence[tuple]) -> DefaultResponse:
+        try:
+            inserted = 0
+            extended = 0
+            skipped = 0
+            chunk_size = settings.PRICE_BATCH_SIZE
+            
+            started = time.perf_counter()
+            async with db_manager.get_session() as session:
+                for start in range(0, len(records), chunk_size):
+                    counts = await self.store_price_chunk(session, records[start:start + chunk_size])
+                    inserted += counts['inserted']
+                    extended += counts['extended']
+                    skipped += counts['skipped']
+                
+                await session.commit()
+                DB_WRITE_SECONDS.observe(time.perf_counter() - started, operation='price_history_batch')
+            
+            if skipped:
+                logger.warning(f"Пропущено {skipped} цен для несуществующих товаров")
+            logger.info(f"Пакетно добавлено {inserted} записей истории цен, продлено {extended}")
+            return DefaultResponse(
+                error=False,
+                message="Цены успешно добавлены",
+                payload={"inserted": inserted, "extended": extended, "skipped": skipped}
+            )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при пакетном добавлении истории цен: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при пакетном добавлении истории цен: {str(e)}",
+                payload=None
+            )
+
+    async def reconcile_price_history(self, observations: Sequence[tuple], tolerance: int = 300) -> DefaultResponse:
+        try:
+            inserted = 0
+            updated = 0
+            unchanged = 0
+            chunk_size = settings.PRICE_BATCH_SIZE
+            history_table = PriceHistory.__table__
+            window = timedelta(seconds=tolerance)
+            
+            by_product = {}
+            for product_id, price, observed_at in observations:
+                by_product.setdefault(product_id, []).append((observed_at, price))
+            product_ids = list(by_product.keys())
+            
+            async with db_manager.get_session() as session:
+                for start in range(0, len(product_ids), chunk_size):
+                    chunk = product_ids[start:start + chunk_size]
+                    earliest = min(observed_at for product_id in chunk for observed_at, _ in by_product[product_id])
+                    latest = max(observed_at for product_id in chunk for observed_at, _ in by_product[product_id])
+                    
+                    result = await session.execute(
+                        select(PriceHistory.id, PriceHistory.product_id, PriceHistory.price, PriceHistory.created_at, PriceHistory.last_seen_at)
+                        .where(
+                            PriceHistory.product_id.in_(chunk),
+                            PriceHistory.created_at <= latest + window,
+                            func.coalesce(PriceHistory.last_seen_at, PriceHistory.created_at) >= earliest - window
+                        )
+                    )
+                    rows = {}
+                    for row in result:
+                        rows.setdefault(row.product_id, []).append(row)
+                    
+                    corrections = {}
+                    missing = []
+                    for product_id in chunk:
+                        for observed_at, price in by_product[product_id]:
+                            match = next(
+                                (
+                                    row for row in rows.get(product_id, [])
+                                    if row.created_at - window <= observed_at <= (row.last_seen_at or row.created_at) + window
+                                ),
+                                None
+                            )
+                            if match is None or (match.id is None and match.price != price):
+                                missing.append({
+                                    'product_id': product_id,
+                                    'price': price,
+                                    'created_at': observed_at,
+                                    'last_seen_at': observed_at,
+                                    'observations': 1
+                                })
+                                rows.setdefault(product_id, []).append(
+                                    SimpleNamespace(id=None, price=price, created_at=observed_at, last_seen_at=observed_at)
+                                )
+                            elif match.id is not None and match.price != price:
+                                corrections[match.id] = {'row_id': match.id, 'row_created': match.created_at, 'price': price}
+                            else:
+                                unchanged += 1
+                    
+                    if corrections:
+                        await session.execute(
+                            update(history_table)
+                            .where(
+                                history_table.c.id == bindparam('row_id'),
+                                history_table.c.created_at == bindparam('row_created')
+                            )
+                            .values(price=bindparam('price')),
+                            list(corrections.values())
+                        )
+                        updated += len(corrections)
+                    
+                    if missing:
+                        await ensure_partitions(
+                            session,
+                            min(row['created_at'] for row in missing),
+                            max(row['created_at'] for row in missing)
+                        )
+                        await session.execute(insert(PriceHistory).values(missing))
+                        inserted += len(missing)
+                    
+                    if corrections or missing:
+                        await self.refresh_latest_prices(session, chunk)
+                
+                await session.commit()
+            
+            logger.info(f"Сверка истории цен: добавлено {inserted}, исправлено {updated}, без изменений {unchanged}")
+            return DefaultResponse(
+                error=False,
+                message="История цен сверена с архивом",
+                payload={"inserted": inserted, "updated": updated, "unchanged": unchanged}
+            )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при сверке истории цен: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при сверке истории цен: {str(e)}",
+                payload=None
+            )
+
+    async def upsert_latest_prices(self, session, observations: Dict[int, List[tuple]]):
+        if not observations:
+            return
+        
+        values = []
+        for product_id, points in observations.items():
+            points = sorted(points, key=lambda point: point[0])
+            observed_at, price = points[-1]
+            changed_at, previous_price = points[0][0], None
+            for (_, earlier_price), (later_at, later_price) in zip(points, points[1:]):
+                if later_price != earlier_price:
+                    changed_at, previous_price = later_at, earlier_price
+            values.append({
+                'product_id': product_id,
+                'price': price,
+                'observed_at': observed_at,
+                'changed_at': changed_at,
+                'previous_price': previous_price,
+                'change_pct': (price - previous_price) / previous_price * 100 if previous_price else None
+            })
+        
+        latest_table = LatestPrice.__table__
+        statement = pg_insert(latest_table).values(values)
+        excluded = statement.excluded
+        changed_in_batch = excluded.previous_price.isnot(None)
+        changed = latest_table.c.price != excluded.price
+        
+        await session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[latest_table.c.product_id],
+                set_={
+                    'price': excluded.price,
+                    'observed_at': excluded.observed_at,
+                    'changed_at': case(
+                        (changed_in_batch, excluded.changed_at),
+                        (changed, excluded.changed_at),
+                        else_=latest_table.c.changed_at
+                    ),
+                    'previous_price': case(
+                        (changed_in_batch, excluded.previous_price),
+                        (changed, latest_table.c.price),
+                        else_=latest_table.c.previous_price
+                    ),
+                    'change_pct': case(
+                        (changed_in_batch, excluded.change_pct),
+                        (changed, (excluded.price - latest_table.c.price) / func.nullif(latest_table.c.price, 0) * 100),
+                        else_=latest_table.c.change_pct
+                    )
+                },
+                where=latest_table.c.observed_at <= excluded.observed_at
+            )
+        )
+
+    async def refresh_latest_prices(self, session, product_ids: Sequence[int]):
+        await session.execute(
+            text(LATEST_PRICE_REFRESH.format(where="WHERE product_id = ANY(:product_ids)")),
+            {'product_ids': list(product_ids)}
+        )
+
+    async def update_rollups(self, product_ids: Sequence[int], since: datetime) -> DefaultResponse:
+        if not product_ids:
+            return DefaultResponse(error=False, message="Нет товаров для агрегации", payload={"products": 0})
+        
+        try:
+            started = time.perf_counter()
+            async with db_manager.get_session() as session:
+                for start in range(0, len(product_ids), settings.PRICE_BATCH_SIZE):
+                    chunk = list(product_ids[start:start + settings.PRICE_BATCH_SIZE])
+                    for statement in rollup_statements(ROLLUP_TOUCHED_RECENT):
+                        await session.execute(text(statement), {'product_ids': chunk, 'since': since})
+                await session.commit()
+            DB_WRITE_SECONDS.observe(time.perf_counter() - started, operation='rollups')
+            
+            logger.info(f"Агрегаты цен обновлены для {len(product_ids)} товаров")
+            return DefaultResponse(
+                error=False,
+                message="Агрегаты цен обновлены",
+                payload={"products": len(product_ids)}
+            )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при обновлении агрегатов цен: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при обновлении агрегатов цен: {str(e)}",
+                payload=None
+            )
+
+    async def maintain_price_history(self) -> DefaultResponse:
+        try:
+            started = time.perf_counter()
+            async with db_manager.engine.connect() as lock_conn:
+                lock_conn = await lock_conn.execution_options(isolation_level="AUTOCOMMIT")
+                if not await try_maintenance_lock(lock_conn):
+                    return DefaultResponse(
+                        error=False,
+                        message="Обслуживание секций уже выполняется другим экземпляром",
+                        payload=None
+                    )
+                try:
+                    async with db_manager.engine.begin() as conn:
+                        created = await ensure_future_partitions(conn, settings.PARTITION_PRECREATE_MONTHS)
+                    retention = await apply_retention(
+                        db_manager.engine,
+                        settings.HISTORY_RAW_RETENTION_DAYS,
+                        settings.HISTORY_DROP_AFTER_DAYS,
+                        settings.PARTITION_KEEP_DETACHED
+                    )
+                finally:
+                    await release_maintenance_lock(lock_conn)
+            DB_WRITE_SECONDS.observe(time.perf_counter() - started, operation='partition_maintenance')
+            
+            logger.info(
+                f"Обслуживание истории цен: создано секций {created}, "
+                f"прорежено {retention['downsampled']}, удалено {retention['dropped']}"
+            )
+            return DefaultResponse(
+                error=False,
+                message="Секции истории цен обслужены",
+                payload={"created": created, **retention}
+            )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при обслуживании секций истории цен: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при обслуживании секций истории цен: {str(e)}",
+                payload=None
+            )
+
+    async def get_price_rollups(
+        self,
+        product_id: int,
+        bucket: str = 'day',
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None
+    ) -> DefaultResponse:
+        if bucket not in ROLLUP_BUCKETS:
+            return DefaultResponse(
+                error=True,
+                message=f"Неизвестный интервал агрегации: {bucket}, допустимые: {', '.join(ROLLUP_BUCKETS)}",
+                payload=None
+            )
+        
+        try:
+            query = (
+                select(PriceRollup)
+                .where(PriceRollup.product_id == product_id, PriceRollup.bucket == bucket)
+                .order_by(PriceRollup.bucket_start)
+            )
+            if date_from:
+                query = query.where(PriceRollup.last_at >= self.to_naive_utc(date_from))
+            if date_to:
+                query = query.where(PriceRollup.bucket_start <= self.to_naive_utc(date_to))
+            
+            async with db_manager.get_session() as session:
+                result = await session.execute(query)
+                rollups = result.scalars().all()
+                
+                rollups_response = [
+                    PriceRollupResponse(
+                        bucket_start=rollup.bucket_start,
+                        open=rollup.open,
+                        high=rollup.high,
+                        low=rollup.low,
+                        close=rollup.close,
+                        avg=rollup.total / rollup.weight if rollup.weight else rollup.close,
+                        observations=rollup.observations,
+                        first_at=rollup.first_at,
+                        last_at=rollup.last_at
+                    )
+                    for rollup in rollups
+                ]
+                
+                logger.info(f"Получено {len(rollups)} агрегатов цен ({bucket}) для товара ID {product_id}")
+                return DefaultResponse(
+                    error=False,
+                    message="Агрегаты цен успешно получены",
+                    payload=rollups_response
+                )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при получении агрегатов цен: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при получении агрегатов цен: {str(e)}",
+                payload=None
+            )
+
+    async def get_current_price(self, product_id: int) -> Optional[float]:
+        try:
+            async with db_manager.get_session() as session:
+                latest_price = await session.get(LatestPrice, product_id)
+                return latest_price.price if latest_price else None
+                
+        except Exception as e:
+            logger.error(f"Ошибка при получении текущей цены: {str(e)}")
+            return None
+
+    async def get_latest_price(self, product_id: int) -> DefaultResponse:
+        try:
+            async with db_manager.get_session() as session:
+                latest_price = await session.get(LatestPrice, product_id)
+                if not latest_price:
+                    return DefaultResponse(error=True, message="Цена товара еще не получена", payload=None)
+                
+                return DefaultResponse(
+                    error=False,
+                    message="Текущая цена успешно получена",
+                    payload=LatestPriceResponse.model_validate(latest_price)
+                )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при получении текущей цены: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при получении текущей цены: {str(e)}",
+                payload=None
+            )
+
+    def expand_observations(self, record: PriceHistoryResponse) -> List[PriceHistoryResponse]:
+        if record.observations <= 1 or not record.last_seen_at:
+            return [record]
+        
+        step = (record.last_seen_at - record.created_at) / (record.observations - 1)
+        return [
+            record.model_copy(update={
+                'created_at': record.created_at + step * index,
+                'last_seen_at': record.created_at + step * index,
+                'observations': 1
+            })
+            for index in reversed(range(record.observations))
+        ]
+
+    async def get_price_history_page(
+        self,
+        product_id: int,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        date_from: Optional[datetime] = None,
+        date_to: Optional[datetime] = None,
+        expand: bool = False
+    ) -> DefaultResponse:
+        try:
+            limit = self.page_limit(limit)
+            query = (
+                select(PriceHistory)
+                .where(PriceHistory.product_id == product_id)
+                .order_by(PriceHistory.created_at.desc(), PriceHistory.id.desc())
+                .limit(limit + 1)
+            )
+            if date_from:
+                query = query.where(PriceHistory.created_at >= self.to_naive_utc(date_from))
+            if date_to:
+                query = query.where(PriceHistory.created_at <= self.to_naive_utc(date_to))
+            
+            cursor_id = None
+            skip = 0
+            if cursor:
+                values = self.decode_cursor(cursor)
+                position = tuple_(PriceHistory.created_at, PriceHistory.id)
+                key = tuple_(datetime.fromisoformat(values[0]), int(values[1]))
+                if len(values) > 2:
+                    cursor_id, skip = int(values[1]), int(values[2])
+                    query = query.where(position <= key)
+                else:
+                    query = query.where(position < key)
+            
+            async with db_manager.get_session() as session:
+                product = await session.get(Product, product_id)
+                if not product:
+                    logger.warning(f"Попытка получить историю цен для несуществующего товара: ID {product_id}")
+                    return DefaultResponse(
+                        error=True,
+                        message="Товар не найден",
+                        payload=None
+                    )
+                
+                result = await session.execute(query)
+                price_history = result.scalars().all()
+                
+                next_cursor = None
+                if expand:
+                    items = []
+                    for ph in price_history:
+                        offset = skip if ph.id == cursor_id else 0
+                        observations = self.expand_observations(PriceHistoryResponse.model_validate(ph))[offset:]
+                        room = limit - len(items)
+                        if len(observations) > room:
+                            items.extend(observations[:room])
+                            next_cursor = self.encode_cursor(ph.created_at, ph.id, offset + room)
+                            break
+                        items.extend(observations)
+                else:
+                    if len(price_history) > limit:
+                        last = price_history[limit - 1]
+                        next_cursor = self.encode_cursor(last.created_at, last.id)
+                    items = [PriceHistoryResponse.model_validate(ph) for ph in price_history[:limit]]
+                
+                logger.info(f"Получена страница из {len(items)} записей истории цен для товара ID {product_id}")
+                return DefaultResponse(
+                    error=False,
+                    message="История цен успешно получена",
+                    payload=PageResponse[PriceHistoryResponse](items=items, next_cursor=next_cursor)
+                )
+                    
+        except Exception as e:
+            logger.error(f"Ошибка при получении истории цен: {str(e)}")
+            return DefaultResponse(
+                error=True,
+                message=f"Ошибка при получении истории цен: {str(e)}",
+                payload=None
+            )
 
-    async def get_price_history(self, product_id: int) -> DefaultResponse:
+    async def get_price_history(self, product_id: int, expand: bool = False) -> DefaultResponse:
         try:
             async with db_manager.get_session() as session:
                 product = await session.get(Product, product_id)
@@ -201,6 +1648,12 @@ class PriceManager:
                 price_history = result.scalars().all()
                 
                 price_history_response = [PriceHistoryResponse.model_validate(ph) for ph in price_history]
+                if expand:
+                    price_history_response = [
+                        observation
+                        for record in price_history_response
+                        for observation in self.expand_observations(record)
+                    ]
                 
                 logger.info(f"Получено {len(price_history)} записей истории цен для товара ID {product_id}")
                 return DefaultResponse(
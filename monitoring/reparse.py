@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from archive import PageArchive
+from extractors import extract_page
+from database import db_manager
+from pricemanager import PriceManager
+from logger_config import setup_logger
+from config import settings
+
+logger = setup_logger(__name__)
+
+def extract_archived(archive_path: str, record: dict, backend: str):
+    archive = PageArchive(archive_path)
+    html = archive.load(record).decode('utf-8', errors='replace')
+    return extract_page(backend, html).get('price')
+
+async def reparse(args):
+    archive = PageArchive(args.archive)
+
+    if args.prune:
+        archive.apply_retention()
+        return
+
+    since = datetime.fromisoformat(args.since) if args.since else None
+    until = datetime.fromisoformat(args.until) if args.until else None
+
+    if not await db_manager.initialize_database():
+        logger.error("Не удалось инициализировать базу данных")
+        return
+
+    price_manager = PriceManager()
+    products_response = await price_manager.get_all_products()
+    if products_response.error:
+        logger.error(f"Ошибка получения списка товаров: {products_response.message}")
+        return
+    product_ids = {product.link: product.id for product in products_response.payload}
+
+    records = [record for record in archive.iter_records(since, until) if record['link'] in product_ids]
+    pages = {record['digest']: record for record in records}
+    logger.info(f"В архиве найдено {len(records)} загрузок ({len(pages)} уникальных страниц) отслеживаемых товаров")
+
+    loop = asyncio.get_running_loop()
+    with ProcessPoolExecutor(max_workers=args.workers or os.cpu_count() or 1) as executor:
+        prices = await asyncio.gather(*[
+            loop.run_in_executor(executor, extract_archived, str(archive.root), record, args.backend)
+            for record in pages.values()
+        ])
+    prices = dict(zip(pages.keys(), prices))
+
+    observations = [
+        (product_ids[record['link']], prices[record['digest']], record['fetched_at'])
+        for record in records
+        if prices[record['digest']] is not None
+    ]
+    logger.info(f"Цена извлечена для {len(observations)} из {len(records)} загрузок")
+
+    if not args.apply:
+        logger.info("Пробный запуск: история цен не изменена, используйте --apply для записи")
+        return
+
+    result = await price_manager.reconcile_price_history(observations, tolerance=args.tolerance)
+    if result.error:
+        logger.error(result.message)
+    else:
+        logger.info(f"Результат сверки: {result.payload}")
+
+    await db_manager.close_connection()
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Повторный разбор архива страниц и сверка истории цен")
+    arg_parser.add_argument("--archive", default=settings.PAGE_ARCHIVE_PATH, help="Каталог архива страниц")
+    arg_parser.add_argument("--since", help="Начало периода (ISO 8601, UTC)")
+    arg_parser.add_argument("--until", help="Конец периода (ISO 8601, UTC)")
+    arg_parser.add_argument("--backend", default=settings.PARSER_BACKEND, help="Бэкенд разбора HTML")
+    arg_parser.add_argument("--workers", type=int, default=0, help="Количество процессов разбора")
+    arg_parser.add_argument("--tolerance", type=int, default=300, help="Допуск сопоставления с историей, секунд")
+    arg_parser.add_argument("--apply", action="store_true", help="Записать исправления в price_history")
+    arg_parser.add_argument("--prune", action="store_true", help="Только применить политику хранения архива")
+    asyncio.run(reparse(arg_parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
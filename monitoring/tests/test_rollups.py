@@ -0,0 +1,100 @@
+import asyncio
+import os
+import sys
+from datetime import datetime
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+for name in ('DB_HOST', 'DB_PORT', 'DB_USER', 'DB_PASSWORD', 'DB_NAME'):
+    os.environ.setdefault(name, 'test')
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from migrations import ROLLUP_REFRESH, ROLLUP_TOUCHED_ALL, ROLLUP_TOUCHED_RECENT
+
+TEST_DATABASE_URL = os.environ.get('TEST_DATABASE_URL')
+
+pytestmark = pytest.mark.skipif(
+    not TEST_DATABASE_URL,
+    reason="TEST_DATABASE_URL не задан (нужен PostgreSQL, например postgresql+asyncpg://...)"
+)
+
+TEMPORARY_TABLES = (
+    """
+    CREATE TEMPORARY TABLE price_history (
+        id integer PRIMARY KEY,
+        product_id integer NOT NULL,
+        price double precision NOT NULL,
+        created_at timestamp NOT NULL,
+        last_seen_at timestamp,
+        observations integer NOT NULL DEFAULT 1
+    )
+    """,
+    """
+    CREATE TEMPORARY TABLE latest_price (
+        product_id integer PRIMARY KEY,
+        changed_at timestamp
+    )
+    """,
+    """
+    CREATE TEMPORARY TABLE price_rollups (
+        product_id integer,
+        bucket varchar,
+        bucket_start timestamp,
+        open double precision NOT NULL,
+        high double precision NOT NULL,
+        low double precision NOT NULL,
+        close double precision NOT NULL,
+        total double precision NOT NULL,
+        weight double precision NOT NULL,
+        observations integer NOT NULL,
+        first_at timestamp NOT NULL,
+        last_at timestamp NOT NULL,
+        PRIMARY KEY (product_id, bucket, bucket_start)
+    )
+    """,
+)
+
+def refresh_statement(touched: str) -> str:
+    return ROLLUP_REFRESH.format(bucket='day', touched=touched.format(bucket='day'))
+
+async def daily_rollups(touched: str, params: dict = None) -> list:
+    engine = create_async_engine(TEST_DATABASE_URL)
+    try:
+        async with engine.connect() as conn:
+            for statement in TEMPORARY_TABLES:
+                await conn.execute(text(statement))
+            await conn.execute(text("""
+                INSERT INTO price_history (id, product_id, price, created_at, last_seen_at, observations) VALUES
+                    (1, 1, 100, '2024-01-01 00:00', '2024-01-05 00:00', 5),
+                    (2, 1, 90, '2024-01-05 12:00', '2024-01-05 12:00', 1)
+            """))
+            await conn.execute(text("INSERT INTO latest_price VALUES (1, '2024-01-05 12:00')"))
+            await conn.execute(text(refresh_statement(touched)), params or {})
+            result = await conn.execute(text(
+                "SELECT bucket_start, open, high, low, close, total, weight, observations FROM price_rollups ORDER BY bucket_start"
+            ))
+            return result.all()
+    finally:
+        await engine.dispose()
+
+def test_unchanged_run_fills_every_day_it_covers():
+    rows = asyncio.run(daily_rollups(ROLLUP_TOUCHED_ALL))
+
+    assert [row.bucket_start for row in rows] == [datetime(2024, 1, day) for day in range(1, 6)]
+    assert all(row.open == row.close == 100 for row in rows[:4])
+    assert (rows[-1].open, rows[-1].close, rows[-1].low) == (100, 90, 90)
+    assert sum(row.total for row in rows) == pytest.approx(100 * 5 + 90)
+    assert all(row.total / row.weight == pytest.approx(100) for row in rows[:4])
+    assert all(row.low <= row.total / row.weight <= row.high for row in rows)
+    assert [row.observations for row in rows] == [1, 1, 1, 1, 2]
+
+def test_recent_refresh_reaches_buckets_extended_by_last_seen():
+    rows = asyncio.run(daily_rollups(
+        ROLLUP_TOUCHED_RECENT,
+        {'product_ids': [1], 'since': datetime(2024, 1, 3, 12)}
+    ))
+
+    assert [row.bucket_start for row in rows] == [datetime(2024, 1, day) for day in range(3, 6)]